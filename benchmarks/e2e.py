@@ -0,0 +1,232 @@
+"""End-to-end throughput benchmark of SignalBot against a local fake server.
+
+A stand-in for signal-cli-rest-api (websocket receive endpoint plus the send,
+reactions, typing-indicator and groups REST endpoints) runs in a background
+thread. Messages are pushed through the websocket at a fixed rate into a real
+SignalBot.start() loop, and the time until the bot's answer arrives at the fake
+server is recorded as end-to-end latency.
+
+Usage: python -m benchmarks.e2e [--messages N] [--rate R] [--mix ping=8,react=1]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import resource
+import threading
+import time
+
+from aiohttp import web
+
+from signalbot import SignalBot, Command, Context
+
+PHONE_NUMBER = "+49123456789"
+SENDER = "+49987654321"
+
+COMMANDS = ["ping", "react", "typing", "ignore"]
+
+
+class PingCommand(Command):
+    async def handle(self, c: Context):
+        if c.message.text.startswith("ping "):
+            await c.send("pong " + c.message.text[len("ping ") :])
+
+
+class ReactCommand(Command):
+    async def handle(self, c: Context):
+        if c.message.text.startswith("react "):
+            await c.react("👍")
+
+
+class TypingCommand(Command):
+    async def handle(self, c: Context):
+        if c.message.text.startswith("typing "):
+            await c.start_typing()
+            await c.stop_typing()
+            await c.send("typed " + c.message.text[len("typing ") :])
+
+
+class FakeSignalService:
+    """Minimal signal-cli-rest-api, records when answers arrive"""
+
+    def __init__(self, messages: list, rate: float):
+        self.messages = messages  # (id, text), ids are used as timestamps
+        self.rate = rate
+        self.sent_at = {}  # id -> perf_counter when pushed to the bot
+        self.answered_at = {}  # id -> perf_counter when the answer arrived
+        self.expected = sum(1 for _, text in messages if not text.startswith("ignore"))
+        self.done = threading.Event()
+        self.ready = threading.Event()
+        self.port = None
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        app = web.Application()
+        app.router.add_get("/v1/receive/{number}", self._receive)
+        app.router.add_post("/v2/send", self._send)
+        app.router.add_post("/v1/reactions/{number}", self._react)
+        app.router.add_put("/v1/typing-indicator/{number}", self._typing)
+        app.router.add_delete("/v1/typing-indicator/{number}", self._typing)
+        app.router.add_get("/v1/groups/{number}", self._groups)
+
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.ready.set()
+
+        while not self.done.is_set():
+            await asyncio.sleep(0.05)
+        await runner.cleanup()
+
+    async def _receive(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        interval = 1.0 / self.rate
+        start_t = time.perf_counter()
+        for i, (message_id, text) in enumerate(self.messages):
+            delay = start_t + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.sent_at[message_id] = time.perf_counter()
+            await ws.send_str(self._envelope(message_id, text))
+
+        # keep the connection open until the bot answered everything
+        while not self.done.is_set():
+            await asyncio.sleep(0.05)
+        await ws.close()
+        return ws
+
+    async def _send(self, request):
+        payload = await request.json()
+        message_id = int(payload["message"].split(" ")[1])
+        self._answered(message_id)
+        return web.json_response({"timestamp": int(time.time() * 1000)}, status=201)
+
+    async def _react(self, request):
+        payload = await request.json()
+        self._answered(payload["timestamp"])
+        return web.Response(status=204)
+
+    async def _typing(self, request):
+        return web.Response(status=204)
+
+    async def _groups(self, request):
+        return web.json_response([])
+
+    def _answered(self, message_id: int):
+        self.answered_at.setdefault(message_id, time.perf_counter())
+        if len(self.answered_at) >= self.expected:
+            self.done.set()
+
+    @classmethod
+    def _envelope(cls, message_id: int, text: str) -> str:
+        return json.dumps(
+            {
+                "envelope": {
+                    "source": SENDER,
+                    "sourceNumber": SENDER,
+                    "sourceDevice": 1,
+                    "timestamp": message_id,
+                    "dataMessage": {
+                        "timestamp": message_id,
+                        "message": text,
+                        "expiresInSeconds": 0,
+                        "viewOnce": False,
+                    },
+                },
+                "account": PHONE_NUMBER,
+            }
+        )
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"Unknown command {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500, help="messages/s")
+    parser.add_argument("--mix", type=parse_mix, default="ping=8,react=1,typing=1")
+    parser.add_argument("--consumers", type=int, default=3)
+    parser.add_argument("--consumer-mode", default="shared")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    random.seed(args.seed)
+    names = list(args.mix)
+    kinds = random.choices(names, weights=[args.mix[n] for n in names], k=args.messages)
+    messages = [(i + 1, f"{kind} {i + 1}") for i, kind in enumerate(kinds)]
+
+    service = FakeSignalService(messages, args.rate)
+    threading.Thread(target=service.run, daemon=True).start()
+    service.ready.wait()
+
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    bot = SignalBot(
+        {
+            "signal_service": f"127.0.0.1:{service.port}",
+            "phone_number": PHONE_NUMBER,
+            "consumers": {"count": args.consumers, "mode": args.consumer_mode},
+        }
+    )
+    bot.register(PingCommand())
+    bot.register(ReactCommand())
+    bot.register(TypingCommand())
+
+    def stop_when_done():
+        service.done.wait(args.timeout)
+        service.done.set()
+        bot._event_loop.call_soon_threadsafe(bot.stop)
+
+    threading.Thread(target=stop_when_done, daemon=True).start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    bot.start()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies = [
+        service.answered_at[i] - service.sent_at[i] for i in service.answered_at
+    ]
+    if not latencies:
+        print("No answers received")
+        return
+
+    first_sent = min(service.sent_at.values())
+    last_answer = max(service.answered_at.values())
+    print(
+        f"messages: {args.messages} at {args.rate:g}/s, "
+        f"answered: {len(latencies)}/{service.expected}"
+    )
+    print(f"throughput: {len(latencies) / (last_answer - first_sent):,.0f} answers/s")
+    for p in (50, 95, 99):
+        print(f"p{p} latency: {percentile(latencies, p) * 1000:0.2f} ms")
+    rss_growth = (rss_after - rss_before) / 1024
+    print(f"max RSS: {rss_after / 1024:0.1f} MiB (+{rss_growth:0.1f})")
+
+
+if __name__ == "__main__":
+    main()
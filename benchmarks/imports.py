@@ -0,0 +1,54 @@
+"""Measure the cold import time of signalbot and guard it against a budget.
+
+Every import runs in a fresh interpreter, the median of several runs is
+reported. The interpreter start-up itself is measured as well and subtracted.
+Exits with status 1 if `import signalbot` takes longer than the budget.
+
+Usage: python -m benchmarks.imports [--runs N] [--budget SECONDS]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    "import signalbot",
+    "from signalbot import Command, Message",
+    "from signalbot import SignalBot",
+]
+
+
+def import_time(statement: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start_t = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        timings.append(time.perf_counter() - start_t)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument(
+        "--budget", type=float, default=0.1, help="seconds for import signalbot"
+    )
+    args = parser.parse_args()
+
+    baseline = import_time("pass", args.runs)
+    print(f"interpreter start-up: {baseline * 1000:0.1f} ms")
+
+    results = {}
+    for statement in STATEMENTS:
+        results[statement] = import_time(statement, args.runs) - baseline
+        print(f"{statement}: {results[statement] * 1000:0.1f} ms")
+
+    if results["import signalbot"] > args.budget:
+        print(f"import signalbot is over the budget of {args.budget * 1000:0.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
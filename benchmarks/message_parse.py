@@ -0,0 +1,101 @@
+"""Compare the throughput of Message.parse with the previous implementation.
+
+Usage: python -m benchmarks.message_parse [--number N]
+"""
+
+import argparse
+import json
+import timeit
+
+from signalbot import Message, MessageType, RawMessagePolicy
+from signalbot.message import UnknownMessageFormatError
+from signalbot.serialization import JSON_LIBRARY
+
+RAW_MESSAGE = '{"envelope":{"source":"+490123456789","sourceNumber":"+490123456789","sourceUuid":"<uuid>","sourceName":"<name>","sourceDevice":1,"timestamp":1632576001632,"syncMessage":{"sentMessage":{"timestamp":1632576001632,"message":"Uhrzeit","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"<groupid>","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}},"account":"+49987654321","subscription":0}'  # noqa
+
+
+def legacy_parse(raw_message: str) -> Message:
+    """Message.parse as it was before the fast path, kept for comparison"""
+
+    def parse_group_information(message):
+        try:
+            return message["groupInfo"]["groupId"]
+        except Exception:
+            return None
+
+    def parse_mentions(message):
+        try:
+            return message["mentions"]
+        except Exception:
+            return []
+
+    def parse_reaction(message):
+        try:
+            return message["reaction"]["emoji"]
+        except Exception:
+            return None
+
+    try:
+        raw_message = json.loads(raw_message)
+    except Exception:
+        raise UnknownMessageFormatError
+
+    try:
+        source = raw_message["envelope"]["source"]
+        timestamp = raw_message["envelope"]["timestamp"]
+    except Exception:
+        raise UnknownMessageFormatError
+
+    if "syncMessage" in raw_message["envelope"]:
+        type = MessageType.SYNC_MESSAGE
+        try:
+            text = raw_message["envelope"]["syncMessage"]["sentMessage"]["message"]
+        except Exception:
+            raise UnknownMessageFormatError
+        sent_message = raw_message["envelope"]["syncMessage"]["sentMessage"]
+        group = parse_group_information(sent_message)
+        reaction = parse_reaction(raw_message["envelope"]["syncMessage"]["sentMessage"])
+        mentions = parse_mentions(raw_message["envelope"]["syncMessage"]["sentMessage"])
+    elif "dataMessage" in raw_message["envelope"]:
+        type = MessageType.DATA_MESSAGE
+        try:
+            text = raw_message["envelope"]["dataMessage"]["message"]
+        except Exception:
+            raise UnknownMessageFormatError
+        group = parse_group_information(raw_message["envelope"]["dataMessage"])
+        reaction = parse_reaction(raw_message["envelope"]["dataMessage"])
+        mentions = parse_mentions(raw_message["envelope"]["dataMessage"])
+    else:
+        raise UnknownMessageFormatError
+
+    return Message(
+        source, timestamp, type, text, [], group, reaction, mentions, raw_message
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    candidates = [
+        ("legacy", lambda: legacy_parse(RAW_MESSAGE)),
+        ("keep", lambda: Message.parse(RAW_MESSAGE, RawMessagePolicy.KEEP)),
+        ("lazy", lambda: Message.parse(RAW_MESSAGE, RawMessagePolicy.LAZY)),
+        ("drop", lambda: Message.parse(RAW_MESSAGE, RawMessagePolicy.DROP)),
+    ]
+
+    print(f"JSON library: {JSON_LIBRARY}, {args.number} messages per run")
+    baseline = None
+    for name, parse in candidates:
+        seconds = min(timeit.repeat(parse, number=args.number, repeat=5))
+        throughput = args.number / seconds
+        baseline = baseline or throughput
+        print(
+            f"{name:>8}: {throughput:12,.0f} messages/s "
+            f"({throughput / baseline:0.2f}x legacy)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,77 @@
-from .bot import SignalBot
-from .command import Command, CommandError, triggered
-from .message import Message, MessageType, UnknownMessageFormatError
-from .api import SignalAPI, ReceiveMessagesError, SendMessageError
+import importlib
+from typing import TYPE_CHECKING
+
+# light modules are imported right away, everything that pulls in asyncio,
+# aiohttp, apscheduler, redis or websockets is imported on first access
+from .command import Command, CommandError, triggered, prefix, regex
+from .message import (
+    Attachment,
+    Message,
+    MessageType,
+    RawMessagePolicy,
+    UnknownMessageFormatError,
+)
 from .context import Context
 
+if TYPE_CHECKING:
+    from .bot import SignalBot
+    from .api import (
+        SignalAPI,
+        ReceiveMessagesError,
+        SendMessageError,
+        DownloadAttachmentError,
+        AttachmentTooLargeError,
+    )
+    from .job_queue import JobQueue, OverflowPolicy
+    from .receive import ReceiveManager, ConnectionState
+
+_LAZY_IMPORTS = {
+    "SignalBot": ".bot",
+    "SignalAPI": ".api",
+    "ReceiveMessagesError": ".api",
+    "SendMessageError": ".api",
+    "DownloadAttachmentError": ".api",
+    "AttachmentTooLargeError": ".api",
+    "JobQueue": ".job_queue",
+    "OverflowPolicy": ".job_queue",
+    "ReceiveManager": ".receive",
+    "ConnectionState": ".receive",
+}
+
 __all__ = [
     "SignalBot",
     "Command",
     "CommandError",
     "triggered",
+    "prefix",
+    "regex",
+    "Attachment",
     "Message",
     "MessageType",
+    "RawMessagePolicy",
     "UnknownMessageFormatError",
     "SignalAPI",
     "ReceiveMessagesError",
     "SendMessageError",
+    "DownloadAttachmentError",
+    "AttachmentTooLargeError",
     "Context",
+    "JobQueue",
+    "OverflowPolicy",
+    "ReceiveManager",
+    "ConnectionState",
 ]
+
+
+def __getattr__(name: str):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # later lookups do not go through __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
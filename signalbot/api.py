@@ -1,5 +1,16 @@
 import aiohttp
-import websockets
+import asyncio
+import email.utils
+import logging
+import os
+import tempfile
+import time
+from typing import AsyncIterator, Callable
+import urllib.parse
+
+from .metrics import MetricsRegistry
+from .ratelimit import RateLimiter
+from .upload import json_body_with_attachments
 
 
 class SignalAPI:
@@ -7,23 +18,244 @@ class SignalAPI:
         self,
         signal_service: str,
         phone_number: str,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        keepalive_timeout: float = 15.0,
+        rate_limiter: RateLimiter = None,
+        max_retries: int = 3,
+        max_retry_after: float = 60.0,
+        metrics: MetricsRegistry = None,
+        ping_interval: float = 20.0,
+        ping_timeout: float = 20.0,
+        attachment_max_size: int = None,
+        attachment_cache_dir: str = None,
     ):
         self.signal_service = signal_service
         self.phone_number = phone_number
 
-        # self.session = aiohttp.ClientSession()
+        # connection pool settings of the shared session, 0 means no limit
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+
+        self.session = None  # created lazily, see .open()
+        self._closed = False  # set by .close(), no new session after that
+
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries  # on 429 Too Many Requests
+        self.max_retry_after = max_retry_after  # seconds, longer waits give up
+        self.metrics = metrics
+
+        # keepalive of the receive websocket, None disables pings
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+
+        self.attachment_max_size = attachment_max_size  # bytes, None is no limit
+        self.attachment_cache_dir = attachment_cache_dir  # None disables the cache
+
+    async def open(self):
+        """Create the shared HTTP session that is reused by all REST calls"""
+        self._closed = False
+        self._get_session()
+
+    async def close(self):
+        """Close the shared HTTP session and all pooled connections, requests
+        fail afterwards until .open() is called again"""
+        self._closed = True
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._closed:
+            # a new session would never be closed
+            raise aiohttp.ClientConnectionError("SignalAPI is closed")
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def _request(
+        self,
+        method: str,
+        uri: str,
+        recipients: list = (),
+        read_body: bool = True,
+        data_factory: Callable[[], AsyncIterator[bytes]] = None,
+        rate_limited: bool = True,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """Send a request through the rate limiter, retry on 429 responses.
+
+        Requests with rate_limited=False (receiving, groups, downloads) take
+        no tokens and do not wait for a backoff caused by sends.
+
+        With read_body=False the body of a successful response is not read,
+        the caller has to read it and release the response. data_factory
+        creates a streamed request body, once per attempt.
+        """
+        rate_limiter = self.rate_limiter if rate_limited else None
+        for attempt in range(self.max_retries + 1):
+            if rate_limiter is not None:
+                await rate_limiter.acquire(recipients)
+
+            if data_factory is not None:
+                kwargs["data"] = data_factory()
+
+            start_t = time.perf_counter()
+            session = self._get_session()
+            try:
+                resp = await getattr(session, method)(uri, **kwargs)
+                # read the body so that the connection goes back to the pool
+                if read_body or resp.status >= 400:
+                    await resp.read()
+            except Exception:
+                self._observe_request(method, uri, start_t, "error")
+                raise
+            self._observe_request(method, uri, start_t, resp.status)
+
+            if resp.status != 429:
+                break
+
+            retry_after = self._retry_after(resp)
+            if retry_after > self.max_retry_after:
+                # do not pause all requests for that long, fail this one
+                if rate_limiter is not None:
+                    rate_limiter.rate_limited += 1
+                    rate_limiter.rejected += 1
+                logging.warning(
+                    f"[SignalAPI] Rate limited by {uri} for {retry_after:0.0f}s, "
+                    f"more than {self.max_retry_after}s, giving up"
+                )
+                break
+
+            if rate_limiter is not None:
+                rate_limiter.rate_limited += 1
+                if attempt == self.max_retries:
+                    rate_limiter.rejected += 1
+                    break
+                rate_limiter.retries += 1
+                rate_limiter.backoff(retry_after)
+            elif attempt < self.max_retries:
+                await asyncio.sleep(retry_after)
+
+            logging.warning(
+                f"[SignalAPI] Rate limited by {uri}, retrying in {retry_after}s"
+            )
+
+        resp.raise_for_status()
+        return resp
+
+    def _observe_request(self, method: str, uri: str, start_t: float, status):
+        if self.metrics is None:
+            return
+
+        # group by route, not by phone number or attachment id
+        endpoint = urllib.parse.urlsplit(uri).path.replace(
+            self.phone_number, "{number}"
+        )
+        if endpoint.startswith("/v1/attachments/"):
+            endpoint = "/v1/attachments/{id}"
+        self.metrics.histogram(
+            "api_request_duration_seconds",
+            "Latency of requests to signal-cli-rest-api",
+            ("endpoint", "method"),
+        ).observe(time.perf_counter() - start_t, endpoint=endpoint, method=method)
+        self.metrics.counter(
+            "api_responses_total",
+            "Responses of signal-cli-rest-api by status code",
+            ("endpoint", "method", "status"),
+        ).inc(endpoint=endpoint, method=method, status=status)
+
+    @classmethod
+    def _retry_after(cls, resp: aiohttp.ClientResponse, default: float = 1.0):
+        value = resp.headers.get("Retry-After")
+        if value is None:
+            return default
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
 
-    async def receive(self):
+    async def receive(self, on_connect: Callable[[], None] = None):
         try:
             uri = self._receive_ws_uri()
-            self.connection = websockets.connect(uri, ping_interval=None)
+            import websockets  # only loaded by bots that receive
+
+            self.connection = websockets.connect(
+                uri, ping_interval=self.ping_interval, ping_timeout=self.ping_timeout
+            )
             async with self.connection as websocket:
+                if on_connect is not None:
+                    on_connect()
                 async for raw_message in websocket:
                     yield raw_message
 
         except Exception as e:
             raise ReceiveMessagesError(e)
 
+    async def receive_batch(self, timeout: float = 1, max_messages: int = None) -> list:
+        """Fetch the messages that arrived since the last call over REST, for
+        signal-cli-rest-api in normal or native mode without websocket.
+        The server waits up to timeout seconds for new messages."""
+        uri = self._receive_rest_uri()
+        params = {"timeout": str(timeout)}
+        if max_messages is not None:
+            params["max_messages"] = str(max_messages)
+        try:
+            resp = await self._request("get", uri, rate_limited=False, params=params)
+            batch = await resp.json()
+        except (
+            aiohttp.ClientError,
+            aiohttp.http_exceptions.HttpProcessingError,
+            ValueError,
+        ) as e:
+            raise ReceiveMessagesError(e)
+
+        if not isinstance(batch, list):
+            raise ReceiveMessagesError(f"Unexpected response: {batch}")
+        return batch
+
+    async def poll(
+        self,
+        on_connect: Callable[[], None] = None,
+        min_interval: float = 0.1,
+        max_interval: float = 5.0,
+        timeout: float = 1,
+        max_messages: int = None,
+    ) -> AsyncIterator[list]:
+        """Yield batches of received messages (decoded dicts) forever.
+
+        The next poll follows after min_interval while messages arrive, the
+        interval doubles with every empty batch up to max_interval.
+        """
+        interval = min_interval
+        connected = False
+        while True:
+            batch = await self.receive_batch(timeout, max_messages)
+            if not connected:
+                connected = True
+                if on_connect is not None:
+                    on_connect()
+
+            if batch:
+                interval = min_interval
+                yield batch
+            else:
+                interval = min(max_interval, interval * 2)
+            await asyncio.sleep(interval)
+
     async def send(
         self,
         receiver: str,
@@ -35,7 +267,39 @@ class SignalAPI:
         quote_timestamp: str = None,
         mentions: list = None,
         text_mode: str = None,
+        attachments: list = None,
+    ) -> aiohttp.ClientResponse:
+        return await self.send_batch(
+            [receiver],
+            message,
+            base64_attachments=base64_attachments,
+            quote_author=quote_author,
+            quote_mentions=quote_mentions,
+            quote_message=quote_message,
+            quote_timestamp=quote_timestamp,
+            mentions=mentions,
+            text_mode=text_mode,
+            attachments=attachments,
+        )
+
+    async def send_batch(
+        self,
+        receivers: list,
+        message: str,
+        base64_attachments: list = None,
+        quote_author: str = None,
+        quote_mentions: list = None,
+        quote_message: str = None,
+        quote_timestamp: str = None,
+        mentions: list = None,
+        text_mode: str = None,
+        attachments: list = None,
     ) -> aiohttp.ClientResponse:
+        """Send the same message to several receivers with one request.
+
+        attachments are file paths, binary file-like objects or bytes, they
+        are base64 encoded chunk by chunk while the request body is sent.
+        """
         uri = self._send_rest_uri()
         if base64_attachments is None:
             base64_attachments = []
@@ -44,7 +308,7 @@ class SignalAPI:
             "base64_attachments": base64_attachments,
             "message": message,
             "number": self.phone_number,
-            "recipients": [receiver],
+            "recipients": list(receivers),
         }
 
         if quote_author:
@@ -60,15 +324,22 @@ class SignalAPI:
         if text_mode:
             payload["text_mode"] = text_mode
 
+        if attachments:
+            request_kwargs = {
+                "data_factory": json_body_with_attachments(payload, attachments),
+                "headers": {"Content-Type": "application/json"},
+            }
+        else:
+            request_kwargs = {"json": payload}
+
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.post(uri, json=payload)
-                resp.raise_for_status()
-                return resp
+            return await self._request("post", uri, receivers, **request_kwargs)
         except (
             aiohttp.ClientError,
             aiohttp.http_exceptions.HttpProcessingError,
             KeyError,
+            OSError,
+            ValueError,
         ):
             raise SendMessageError
 
@@ -83,10 +354,7 @@ class SignalAPI:
             "timestamp": timestamp,
         }
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.post(uri, json=payload)
-                resp.raise_for_status()
-                return resp
+            return await self._request("post", uri, [recipient], json=payload)
         except (
             aiohttp.ClientError,
             aiohttp.http_exceptions.HttpProcessingError,
@@ -99,10 +367,7 @@ class SignalAPI:
             "recipient": receiver,
         }
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.put(uri, json=payload)
-                resp.raise_for_status()
-                return resp
+            return await self._request("put", uri, [receiver], json=payload)
         except (
             aiohttp.ClientError,
             aiohttp.http_exceptions.HttpProcessingError,
@@ -115,10 +380,7 @@ class SignalAPI:
             "recipient": receiver,
         }
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.delete(uri, json=payload)
-                resp.raise_for_status()
-                return resp
+            return await self._request("delete", uri, [receiver], json=payload)
         except (
             aiohttp.ClientError,
             aiohttp.http_exceptions.HttpProcessingError,
@@ -128,19 +390,112 @@ class SignalAPI:
     async def get_groups(self):
         uri = self._groups_uri()
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.get(uri)
-                resp.raise_for_status()
-                return await resp.json()
+            resp = await self._request("get", uri, rate_limited=False)
+            return await resp.json()
         except (
             aiohttp.ClientError,
             aiohttp.http_exceptions.HttpProcessingError,
         ):
             raise GroupsError
 
+    async def download_attachment(
+        self,
+        attachment_id: str,
+        max_size: int = None,
+        chunk_size: int = 64 * 1024,
+    ) -> AsyncIterator[bytes]:
+        """Stream an attachment in chunks of at most chunk_size bytes.
+
+        Raises AttachmentTooLargeError as soon as more than max_size bytes
+        (default: attachment_max_size) arrive. With attachment_cache_dir set,
+        complete downloads are kept on disk and served from there next time.
+        """
+        if not attachment_id or os.path.basename(attachment_id) != attachment_id:
+            raise DownloadAttachmentError(f"Invalid attachment id: {attachment_id}")
+        if max_size is None:
+            max_size = self.attachment_max_size
+
+        cache_path = None
+        if self.attachment_cache_dir is not None:
+            cache_path = os.path.join(self.attachment_cache_dir, attachment_id)
+            if os.path.exists(cache_path):
+                if max_size is not None and os.path.getsize(cache_path) > max_size:
+                    raise AttachmentTooLargeError(attachment_id)
+                with open(cache_path, "rb") as f:
+                    while chunk := f.read(chunk_size):
+                        yield chunk
+                return
+
+        uri = self._attachment_uri(attachment_id)
+        try:
+            resp = await self._request("get", uri, read_body=False, rate_limited=False)
+        except (
+            aiohttp.ClientError,
+            aiohttp.http_exceptions.HttpProcessingError,
+        ) as e:
+            raise DownloadAttachmentError(e)
+
+        cache_file = None
+        complete = False
+        try:
+            content_length = resp.content_length
+            if max_size is not None and (content_length or 0) > max_size:
+                raise AttachmentTooLargeError(attachment_id)
+
+            if cache_path is not None:
+                os.makedirs(self.attachment_cache_dir, exist_ok=True)
+                # unique per download, the same attachment may be downloaded
+                # by several commands at once
+                cache_file = tempfile.NamedTemporaryFile(
+                    dir=self.attachment_cache_dir,
+                    prefix=f"{attachment_id}.",
+                    suffix=".part",
+                    delete=False,
+                )
+
+            size = 0
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise AttachmentTooLargeError(attachment_id)
+                if cache_file is not None:
+                    cache_file.write(chunk)
+                yield chunk
+            complete = True
+
+        except aiohttp.ClientError as e:
+            raise DownloadAttachmentError(e)
+
+        finally:
+            resp.release()
+            if cache_file is not None:
+                cache_file.close()
+                if complete:
+                    os.replace(cache_file.name, cache_path)
+                else:
+                    os.remove(cache_file.name)
+
+    async def save_attachment(
+        self, attachment_id: str, path: str, max_size: int = None
+    ) -> str:
+        """Download an attachment to path chunk by chunk"""
+        complete = False
+        try:
+            with open(path, "wb") as f:
+                async for chunk in self.download_attachment(attachment_id, max_size):
+                    f.write(chunk)
+            complete = True
+        finally:
+            if not complete and os.path.exists(path):
+                os.remove(path)
+        return path
+
     def _receive_ws_uri(self):
         return f"ws://{self.signal_service}/v1/receive/{self.phone_number}"
 
+    def _receive_rest_uri(self):
+        return f"http://{self.signal_service}/v1/receive/{self.phone_number}"
+
     def _send_rest_uri(self):
         return f"http://{self.signal_service}/v2/send"
 
@@ -153,6 +508,9 @@ class SignalAPI:
     def _groups_uri(self):
         return f"http://{self.signal_service}/v1/groups/{self.phone_number}"
 
+    def _attachment_uri(self, attachment_id: str):
+        return f"http://{self.signal_service}/v1/attachments/{attachment_id}"
+
 
 class ReceiveMessagesError(Exception):
     pass
@@ -180,3 +538,11 @@ class ReactionError(Exception):
 
 class GroupsError(Exception):
     pass
+
+
+class DownloadAttachmentError(Exception):
+    pass
+
+
+class AttachmentTooLargeError(DownloadAttachmentError):
+    pass
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from typing import Awaitable, Callable
+
+
+def chunked(items: list, size: int) -> list[list]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class SendCoalescer:
+    """Merge identical sends to different receivers into one batch
+
+    The first send of a text opens a batch that is flushed after window
+    seconds. Every send of the same text (and mentions and text mode) within
+    that window joins the batch. Sending the same text to the same receiver
+    twice within the window results in a single message.
+
+    flush is called with the receivers of a batch and the send arguments and
+    returns a dict from receiver to timestamp or to the exception raised while
+    sending to it.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[..., Awaitable[dict]],
+        window: float,
+    ):
+        self._flush = flush
+        self._window = window
+        self._batches = {}  # key -> _Batch
+
+    async def send(
+        self,
+        receiver: str,
+        text: str,
+        mentions: list = None,
+        text_mode: str = None,
+    ) -> int:
+        key = (text, json.dumps(mentions, sort_keys=True), text_mode)
+
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _Batch(text, mentions, text_mode)
+            self._batches[key] = batch
+            batch.task = asyncio.create_task(self._flush_later(key))
+
+        future = batch.futures.get(receiver)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            batch.futures[receiver] = future
+
+        # shield, one cancelled sender must not cancel the others
+        return await asyncio.shield(future)
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self._window)
+        batch = self._batches.pop(key)
+
+        try:
+            results = await self._flush(
+                list(batch.futures),
+                batch.text,
+                mentions=batch.mentions,
+                text_mode=batch.text_mode,
+            )
+        except Exception as e:
+            results = {receiver: e for receiver in batch.futures}
+
+        for receiver, future in batch.futures.items():
+            if future.done():
+                continue
+            result = results.get(receiver)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class _Batch:
+    def __init__(self, text: str, mentions: list, text_mode: str):
+        self.text = text
+        self.mentions = mentions
+        self.text_mode = text_mode
+        self.futures = {}  # receiver -> future of the timestamp
+        self.task = None
@@ -1,18 +1,46 @@
 import asyncio
-from collections import defaultdict
+from collections import defaultdict, deque
+import functools
+import hashlib
+import json
 import time
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
 import traceback
-from typing import Optional, Union, List, Callable
+from typing import Optional, Union, List, Callable, AsyncIterator
 import re
+import zlib
 
 from .api import SignalAPI, ReceiveMessagesError
+from .batching import SendCoalescer, chunked
 from .command import Command
-from .message import Message, UnknownMessageFormatError
-from .storage import RedisStorage, InMemoryStorage
+from .distributed import RedisStreamQueue
+from .executors import Executors
+from .job_queue import JobQueue, OverflowPolicy
+from .message import (
+    Attachment,
+    Message,
+    RawMessagePolicy,
+    UnknownMessageFormatError,
+)
+from .metrics import MetricsRegistry, PrometheusExporter
+from .outbox import Outbox
+from .ratelimit import RateLimiter
+from .receive import ReceiveManager, ConnectionState
+from .router import Route, Router
+from .typing_indicators import TypingIndicators
+from .storage import (
+    RedisStorage,
+    InMemoryStorage,
+    AsyncRedisStorage,
+    AsyncInMemoryStorage,
+    CachedStorage,
+    StorageError,
+)
 from .context import Context
 
+# chats whose eligible commands are cached, the cache starts over when full
+CHAT_CACHE_SIZE = 10000
+
 
 class SignalBot:
     def __init__(self, config: dict):
@@ -22,13 +50,104 @@ class SignalBot:
         ===============
         signal_service: "127.0.0.1:8080"
         phone_number: "+49123456789"
+        accounts: []  # optional, more phone numbers served by the same bot
         storage:
             redis_host: "redis"
             redis_port: 6379
+            max_connections: None  # optional, pool size of bot.async_storage
+            cache:  # optional, LRU cache in front of bot.storage
+                maxsize: 1024
+                ttl: 60
+                write_behind: False
+                flush_interval: 5  # seconds between writes with write_behind
+        http:  # optional, connection pool of the REST client
+            connection_limit: 100
+            connection_limit_per_host: 0
+            keepalive_timeout: 15
+        rate_limit:  # optional, outbound REST calls per account, rates are per second
+            rate: None  # all requests, None is unlimited
+            burst: None
+            per_recipient_rate: None
+            per_recipient_burst: None
+            max_retries: 3  # retries after 429 Too Many Requests
+            max_retry_after: 60  # seconds, a longer Retry-After fails the request
+        raw_message: "lazy"  # optional, "keep", "lazy" or "drop"
+        queue:  # optional, jobs waiting for a consumer
+            maxsize: 1000  # 0 means unbounded
+            overflow: "block"  # "block", "drop_oldest" or "drop_newest"
+            on_drop: None  # called with every dropped (command, message, t, route) job
+        send:  # optional
+            max_recipients: 100  # receivers per request of .send_batch()
+            coalesce_window: 0  # seconds to merge identical .send() calls, 0 is off
+            senders: 4  # tasks sending the messages of .send(..., wait=False)
+            outbox_maxsize: 0  # queued messages per sender, 0 means unbounded
+        consumers:  # optional
+            count: 3
+            mode: "shared"  # "shared" or "sharded", see below
+        receive:  # optional
+            mode: "websocket"  # or "poll" the REST API, e.g. in normal/native mode
+            ping_interval: 20  # seconds between websocket keepalive pings
+            ping_timeout: 20
+            reconnect_min_delay: 0.5  # seconds, grows up to reconnect_max_delay
+            reconnect_max_delay: 30
+            dedupe_window: 1000  # remembered messages to drop redeliveries
+            poll_min_interval: 0.1  # seconds between polls while messages arrive
+            poll_max_interval: 5  # reached by doubling while idle
+            poll_timeout: 1  # seconds the server waits for new messages
+            poll_max_messages: None  # per batch, None is no limit
+        attachments:  # optional, see .download_attachment()
+            max_size: None  # bytes, None is no limit
+            cache_dir: None  # keep downloads on disk, None disables the cache
+        typing:  # optional, see .typing()
+            refresh_interval: 10  # seconds between restarts of a typing indicator
+        groups:  # optional
+            refresh_interval: 3600  # seconds
+            unknown_group_cooldown: 60  # min. seconds between on-demand refreshes
+            unknown_group_timeout: 2  # seconds a message waits for that refresh
+        commands:  # optional, defaults for Command.timeout and .max_concurrency
+            timeout: None  # seconds until handle() is cancelled, None is no limit
+            max_concurrency: None  # handle() calls per command, None is no limit
+            max_backlog: 100  # deferred jobs per limited command, then consumers wait
+        executors:  # optional, see .run_cpu_bound() and .run_blocking()
+            processes: None  # worker processes, None is the number of CPUs
+            threads: None  # worker threads, None is the Python default
+            timeout: None  # default seconds per call, None waits forever
+        distributed:  # optional, work queue on Redis Streams, needs storage
+            role: "both"  # "receiver" only publishes, "worker" only handles
+            stream: "signalbot:messages"
+            group: "signalbot"
+            partitions: 16  # messages of a chat always go to the same partition
+            consumer: None  # unique worker name, defaults to hostname-pid
+            lease_timeout: 30  # seconds until partitions of a dead worker move
+            maxlen: 100000  # approx. max. entries per partition
+        metrics:  # optional, bot.metrics is always collected
+            prometheus:  # serve metrics in the Prometheus text format
+                host: "0.0.0.0"
+                port: 9090
+                path: "/metrics"
         """
         self.config = config
 
+        self.metrics = MetricsRegistry()
+        self.metrics_exporters = []  # started by .start()
+        config_prometheus = (self.config.get("metrics") or {}).get("prometheus")
+        if config_prometheus is not None:
+            self.metrics_exporters.append(PrometheusExporter(**config_prometheus))
+
         self.commands = []  # populated by .register()
+        # dispatch index from trigger words to positions in self.commands
+        self._commands_by_trigger = defaultdict(list)
+        self._commands_by_lower_trigger = defaultdict(list)
+        self._untriggered_commands = []
+        self._router = Router()  # @prefix and @regex commands
+        self._chat_filters = []  # _ChatFilter of each command in self.commands
+        self._commands_by_chat = {}  # (is group, chat) -> positions of commands
+
+        config_commands = self.config.get("commands") or {}
+        self._command_timeout = config_commands.get("timeout")
+        self._command_max_concurrency = config_commands.get("max_concurrency")
+        self._command_max_backlog = config_commands.get("max_backlog", 100)
+        self._command_limits = {}  # command -> _ConcurrencyLimit
 
         self.user_chats = set()  # deprecated
         self.group_chats = set()  # deprecated
@@ -38,18 +157,186 @@ class SignalBot:
         self._groups_by_id = {}
         self._groups_by_internal_id = {}
         self._groups_by_name = defaultdict(list)
+        self._groups_hash = None
+
+        config_groups = self.config.get("groups") or {}
+        self._groups_refresh_interval = config_groups.get("refresh_interval", 3600)
+        self._unknown_group_cooldown = config_groups.get("unknown_group_cooldown", 60)
+        self._unknown_group_timeout = config_groups.get("unknown_group_timeout", 2)
+        self._groups_refreshed_at = float("-inf")
+        self._groups_refresh = None  # on-demand refresh task
 
         try:
             self._phone_number = self.config["phone_number"]
             self._signal_service = self.config["signal_service"]
-            self._signal = SignalAPI(self._signal_service, self._phone_number)
+            config_http = self.config.get("http") or {}
+            config_rate_limit = self.config.get("rate_limit") or {}
+            config_receive = self.config.get("receive") or {}
+            config_attachments = self.config.get("attachments") or {}
+            # every account has its own REST client, receive connection and
+            # rate limiter, Signal rate limits each account on its own
+            self._signals = {}
+            self._rate_limiters = {}
+            accounts = [self._phone_number, *self.config.get("accounts", [])]
+            for phone_number in dict.fromkeys(accounts):
+                self._rate_limiters[phone_number] = RateLimiter(
+                    rate=config_rate_limit.get("rate"),
+                    burst=config_rate_limit.get("burst"),
+                    per_recipient_rate=config_rate_limit.get("per_recipient_rate"),
+                    per_recipient_burst=config_rate_limit.get("per_recipient_burst"),
+                )
+                self._signals[phone_number] = SignalAPI(
+                    self._signal_service,
+                    phone_number,
+                    connection_limit=config_http.get("connection_limit", 100),
+                    connection_limit_per_host=config_http.get(
+                        "connection_limit_per_host", 0
+                    ),
+                    keepalive_timeout=config_http.get("keepalive_timeout", 15.0),
+                    rate_limiter=self._rate_limiters[phone_number],
+                    max_retries=config_rate_limit.get("max_retries", 3),
+                    max_retry_after=config_rate_limit.get("max_retry_after", 60.0),
+                    metrics=self.metrics,
+                    ping_interval=config_receive.get("ping_interval", 20.0),
+                    ping_timeout=config_receive.get("ping_timeout", 20.0),
+                    attachment_max_size=config_attachments.get("max_size"),
+                    attachment_cache_dir=config_attachments.get("cache_dir"),
+                )
+            self._signal = self._signals[self._phone_number]
+            self._rate_limiter = self._rate_limiters[self._phone_number]
         except KeyError:
             raise SignalBotError("Could not initialize SignalAPI with given config")
 
+        try:
+            raw_message = self.config.get("raw_message", "lazy")
+            self._raw_message_policy = RawMessagePolicy[raw_message.upper()]
+        except (AttributeError, KeyError):
+            raise SignalBotError(f"Unknown raw_message policy: {raw_message}")
+
+        self.receive_managers = {
+            account: ReceiveManager(
+                min_delay=config_receive.get("reconnect_min_delay", 0.5),
+                max_delay=config_receive.get("reconnect_max_delay", 30.0),
+                dedupe_window=config_receive.get("dedupe_window", 1000),
+            )
+            for account in self._signals
+        }
+        self.receive_manager = self.receive_managers[self._phone_number]
+
+        self._receive_mode = config_receive.get("mode", "websocket")
+        if self._receive_mode not in ("websocket", "poll"):
+            raise SignalBotError(f"Unknown receive mode: {self._receive_mode}")
+        self._poll_options = {
+            "min_interval": config_receive.get("poll_min_interval", 0.1),
+            "max_interval": config_receive.get("poll_max_interval", 5.0),
+            "timeout": config_receive.get("poll_timeout", 1),
+            "max_messages": config_receive.get("poll_max_messages"),
+        }
+
         self._event_loop = asyncio.get_event_loop()
-        self._q = asyncio.Queue()
+        self._tasks = []  # producers and consumers, cancelled by ._shutdown()
+
+        config_executors = self.config.get("executors") or {}
+        self.executors = Executors(
+            processes=config_executors.get("processes"),
+            threads=config_executors.get("threads"),
+            timeout=config_executors.get("timeout"),
+        )
+
+        config_typing = self.config.get("typing") or {}
+        self.typing_indicators = TypingIndicators(
+            refresh_interval=config_typing.get("refresh_interval", 10.0)
+        )
+
+        config_send = self.config.get("send") or {}
+        self._send_max_recipients = config_send.get("max_recipients", 100)
+        self._send_coalescers = {}  # account -> SendCoalescer
+        self.outbox = Outbox(
+            senders=config_send.get("senders", 4),
+            maxsize=config_send.get("outbox_maxsize", 0),
+        )
+        if config_send.get("coalesce_window", 0) > 0:
+            for account in self._signals:
+                self._send_coalescers[account] = SendCoalescer(
+                    functools.partial(self._send_chunks, account=account),
+                    config_send["coalesce_window"],
+                )
+
+        # In "shared" mode all consumers take jobs from one queue. In "sharded"
+        # mode every consumer owns a queue and all jobs of a chat go to the same
+        # queue, so messages of a chat are handled in order while different
+        # chats are handled in parallel.
+        config_consumers = self.config.get("consumers") or {}
+        self._consumers = config_consumers.get("count", 3)
+        consumer_mode = config_consumers.get("mode", "shared")
+        if consumer_mode not in ("shared", "sharded"):
+            raise SignalBotError(f"Unknown consumer mode: {consumer_mode}")
+        self._sharded = consumer_mode == "sharded"
+
+        try:
+            config_queue = self.config.get("queue") or {}
+            overflow = config_queue.get("overflow", "block")
+            shards = self._consumers if self._sharded else 1
+            self._queues = [
+                JobQueue(
+                    maxsize=config_queue.get("maxsize", 0),
+                    overflow=OverflowPolicy[overflow.upper()],
+                    on_drop=config_queue.get("on_drop"),
+                )
+                for _ in range(shards)
+            ]
+            self._q = self._queues[0]
+        except (AttributeError, KeyError):
+            raise SignalBotError(f"Unknown queue overflow policy: {overflow}")
+
+        self._received_metric = self.metrics.counter(
+            "messages_received_total", "Raw messages received from the API server"
+        )
+        self._parse_failures_metric = self.metrics.counter(
+            "parse_failures_total", "Raw messages with an unknown format"
+        )
+        self._duplicates_metric = self.metrics.counter(
+            "messages_duplicate_total", "Messages dropped as redelivered duplicates"
+        )
+        self.metrics.gauge(
+            "receive_connected",
+            "Accounts with an open receive connection",
+            function=lambda: sum(
+                manager.state == ConnectionState.CONNECTED
+                for manager in self.receive_managers.values()
+            ),
+        )
+        self.metrics.gauge(
+            "queue_depth",
+            "Jobs waiting for a consumer",
+            function=lambda: self.queue_stats()["depth"],
+        )
+        self.metrics.gauge(
+            "command_backlog_depth",
+            "Jobs deferred because their command ran max_concurrency times",
+            function=lambda: self.queue_stats()["deferred"],
+        )
+        self._queue_wait_metric = self.metrics.histogram(
+            "queue_wait_seconds", "Time jobs spent in the queue"
+        )
+        self._handle_metric = self.metrics.histogram(
+            "command_duration_seconds", "Duration of Command.handle", ("command",)
+        )
+        self._handle_errors_metric = self.metrics.counter(
+            "command_errors_total", "Exceptions raised by Command.handle", ("command",)
+        )
+        self._handle_timeouts_metric = self.metrics.counter(
+            "command_timeouts_total", "Command.handle calls cancelled", ("command",)
+        )
+        self._deferred_metric = self.metrics.counter(
+            "command_deferred_total",
+            "Jobs deferred because the command ran max_concurrency times",
+            ("command",),
+        )
 
         try:
+            from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
             self.scheduler = AsyncIOScheduler(event_loop=self._event_loop)
         except Exception as e:
             raise SignalBotError(f"Could not initialize scheduler: {e}")
@@ -59,13 +346,62 @@ class SignalBot:
             self._redis_host = config_storage["redis_host"]
             self._redis_port = config_storage["redis_port"]
             self.storage = RedisStorage(self._redis_host, self._redis_port)
+            try:
+                self.async_storage = AsyncRedisStorage(
+                    self._redis_host,
+                    self._redis_port,
+                    max_connections=config_storage.get("max_connections"),
+                )
+            except ImportError:
+                # redis<4.2 has no redis.asyncio, keep the data in Redis anyway
+                self.async_storage = AsyncInMemoryStorage(self.storage)
+                logging.warning(
+                    "[Bot] redis.asyncio is not available, the async storage "
+                    "blocks on Redis. Please install redis>=4.2"
+                )
         except Exception:
             self.storage = InMemoryStorage()
+            self.async_storage = AsyncInMemoryStorage(self.storage)
             logging.warning(
                 "[Bot] Could not initialize Redis. In-memory storage will be used. "
                 "Restarting will delete the storage!"
             )
 
+        config_cache = (self.config.get("storage") or {}).get("cache")
+        if config_cache:
+            self.storage = CachedStorage(
+                self.storage,
+                maxsize=config_cache.get("maxsize", 1024),
+                ttl=config_cache.get("ttl", 60.0),
+                write_behind=config_cache.get("write_behind", False),
+            )
+            if config_cache.get("write_behind", False):
+                self.scheduler.add_job(
+                    self.storage.flush,
+                    "interval",
+                    seconds=config_cache.get("flush_interval", 5.0),
+                )
+
+        self._distributed = None
+        config_distributed = self.config.get("distributed")
+        self._distributed_role = (config_distributed or {}).get("role", "both")
+        if self._distributed_role not in ("receiver", "worker", "both"):
+            raise SignalBotError(f"Unknown distributed role: {self._distributed_role}")
+        if config_distributed is not None:
+            if not isinstance(self.async_storage, AsyncRedisStorage):
+                raise SignalBotError("Distributed mode needs a Redis storage")
+            self._distributed = RedisStreamQueue(
+                self._redis_host,
+                self._redis_port,
+                stream=config_distributed.get("stream", "signalbot:messages"),
+                group=config_distributed.get("group", "signalbot"),
+                partitions=config_distributed.get("partitions", 16),
+                consumer=config_distributed.get("consumer"),
+                lease_timeout=config_distributed.get("lease_timeout", 30.0),
+                maxlen=config_distributed.get("maxlen", 100000),
+                raw_message_policy=self._raw_message_policy,
+            )
+
     # deprecated
     def listen(self, required_id: str, optional_id: str = None):
         logging.warning(
@@ -106,6 +442,7 @@ class SignalBot:
     # deprecated
     def _listenUser(self, phone_number: str):
         self._listen_mode_activated = True
+        self._commands_by_chat.clear()
         if not self._is_phone_number(phone_number):
             logging.warning(
                 "[Bot] Can't listen for user because phone number does not look valid"
@@ -124,6 +461,7 @@ class SignalBot:
     # deprecated
     def _listenGroup(self, group_id: str, internal_id: str = None):
         self._listen_mode_activated = True
+        self._commands_by_chat.clear()
         if not (self._is_group_id(group_id) and self._is_internal_id(internal_id)):
             logging.warning(
                 "[Bot] Can't listen for group because group id and "
@@ -144,6 +482,7 @@ class SignalBot:
         command.setup()
 
         group_ids = None
+        group_names = []
 
         if isinstance(groups, bool):
             group_ids = groups
@@ -153,23 +492,121 @@ class SignalBot:
             for group in groups:
                 if self._is_group_id(group):  # group is a group id, higher prio
                     group_ids.append(group)
-                else:  # group is a group name
-                    for matched_group in self._groups_by_name:
+                else:  # group is a group name, resolved again on group refresh
+                    group_names.append(group)
+                    for matched_group in self._groups_by_name.get(group, []):
                         group_ids.append(matched_group["id"])
 
+        chat_filter = _ChatFilter(contacts, group_ids, group_names)
+        chat_filter.resolve(self._groups_by_id, self._groups_by_name)
+
+        max_concurrency = command.max_concurrency
+        if max_concurrency is None:
+            max_concurrency = self._command_max_concurrency
+        if max_concurrency is not None:
+            self._command_limits[command] = _ConcurrencyLimit(
+                max_concurrency, self._command_max_backlog
+            )
+
+        self._index_command(len(self.commands), command)
         self.commands.append((command, contacts, group_ids, f))
+        self._chat_filters.append(chat_filter)
+        self._commands_by_chat.clear()
+
+    def _index_command(self, position: int, command: Command):
+        if self._router.add(position, command.handle):
+            return
+
+        triggers = getattr(command.handle, "triggers", None)
+        if triggers is None:
+            self._untriggered_commands.append(position)
+            return
+
+        if getattr(command.handle, "case_sensitive", False):
+            index = self._commands_by_trigger
+        else:
+            index = self._commands_by_lower_trigger
+            triggers = [t.lower() for t in triggers]
+
+        for trigger in set(triggers):
+            index[trigger].append(position)
+
+    def _candidate_commands(self, message: Message, routes: dict = None) -> list[int]:
+        """Positions of all commands that might handle the message, in
+        registration order. Commands with @triggered are only included if the
+        message text matches one of their trigger words, commands with @prefix
+        or @regex only if they are in routes (default: routed now)."""
+        text = message.text
+        if not isinstance(text, str):
+            return self._untriggered_commands
+
+        if routes is None:
+            routes = self._router.match(text)
+        by_trigger = self._commands_by_trigger.get(text)
+        by_lower_trigger = self._commands_by_lower_trigger.get(text.lower())
+        if not by_trigger and not by_lower_trigger and not routes:
+            return self._untriggered_commands
+
+        positions = set(self._untriggered_commands)
+        positions.update(by_trigger or [])
+        positions.update(by_lower_trigger or [])
+        positions.update(routes)
+        return sorted(positions)
 
     def start(self):
-        # TODO: schedule this every hour or so
-        self._event_loop.create_task(self._detect_groups())
-        self._event_loop.create_task(self._produce_consume_messages())
+        for signal in self._signals.values():
+            self._event_loop.run_until_complete(signal.open())
+        for exporter in self.metrics_exporters:
+            self._event_loop.run_until_complete(exporter.start(self.metrics))
+
+        self._tasks.append(self._event_loop.create_task(self._detect_groups()))
+        self._event_loop.run_until_complete(self._produce_consume_messages())
 
         # Add more scheduler tasks here
-        # self.scheduler.add_job(...)
+        self.scheduler.add_job(
+            self._refresh_groups, "interval", seconds=self._groups_refresh_interval
+        )
         self.scheduler.start()
 
         # Run event loop
-        self._event_loop.run_forever()
+        try:
+            self._event_loop.run_forever()
+        finally:
+            self._event_loop.run_until_complete(self._shutdown())
+
+    def stop(self):
+        """Stop the event loop, .start() then shuts down the bot"""
+        self._event_loop.stop()
+
+    async def _shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        # stop receiving and handling before the sessions are closed
+        tasks = self._tasks
+        if self._groups_refresh is not None:
+            tasks.append(self._groups_refresh)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        if isinstance(self.storage, CachedStorage):
+            try:
+                self.storage.flush()
+            except StorageError as e:
+                # shut down the rest anyway, the failed keys are logged
+                logging.error(f"[Bot] Could not flush storage: {e}")
+        for exporter in self.metrics_exporters:
+            await exporter.stop()
+        # queued messages still need the sessions
+        await self.outbox.close()
+        await self.typing_indicators.close()
+        for signal in self._signals.values():
+            await signal.close()
+        await self.async_storage.close()
+        if self._distributed is not None:
+            await self._distributed.close()
+        self.executors.shutdown()
+        logging.info("[Bot] Shut down")
 
     async def send(
         self,
@@ -183,9 +620,56 @@ class SignalBot:
         mentions: list = None,
         text_mode: str = None,
         listen: bool = False,
-    ) -> int:
+        account: str = None,
+        attachments: list = None,
+        wait: bool = True,
+    ) -> int | asyncio.Future:
+        """attachments are file paths, binary file-like objects or bytes, which
+        are streamed instead of being base64 encoded in memory first.
+
+        With wait=False the message is queued in .outbox and a future of the
+        timestamp is returned right away, messages to a chat keep their order.
+        """
         receiver = self._resolve_receiver(receiver)
-        resp = await self._signal.send(
+        signal = self._signal_for(account)
+
+        if not wait:
+            send = functools.partial(
+                self.send,
+                receiver,
+                text,
+                base64_attachments=base64_attachments,
+                quote_author=quote_author,
+                quote_mentions=quote_mentions,
+                quote_message=quote_message,
+                quote_timestamp=quote_timestamp,
+                mentions=mentions,
+                text_mode=text_mode,
+                account=signal.phone_number,
+                attachments=attachments,
+            )
+            return await self.outbox.submit(f"{signal.phone_number}:{receiver}", send)
+
+        if listen:
+            logging.warning(f"[Bot] send(..., listen=True) is not supported anymore")
+
+        is_plain_text = not (
+            base64_attachments
+            or attachments
+            or quote_author
+            or quote_mentions
+            or quote_message
+            or quote_timestamp
+        )
+        send_coalescer = self._send_coalescers.get(signal.phone_number)
+        if send_coalescer is not None and is_plain_text:
+            timestamp = await send_coalescer.send(
+                receiver, text, mentions=mentions, text_mode=text_mode
+            )
+            self.typing_indicators.sent(signal.phone_number, receiver)
+            return timestamp
+
+        resp = await signal.send(
             receiver,
             text,
             base64_attachments=base64_attachments,
@@ -195,47 +679,298 @@ class SignalBot:
             quote_timestamp=quote_timestamp,
             mentions=mentions,
             text_mode=text_mode,
+            attachments=attachments,
         )
         resp_payload = await resp.json()
         timestamp = resp_payload["timestamp"]
         logging.info(f"[Bot] New message {timestamp} sent:\n{text}")
-
-        if listen:
-            logging.warning(f"[Bot] send(..., listen=True) is not supported anymore")
+        self.typing_indicators.sent(signal.phone_number, receiver)
 
         return timestamp
 
+    async def send_batch(
+        self,
+        receivers: list[str],
+        text: str,
+        base64_attachments: list = None,
+        mentions: list = None,
+        text_mode: str = None,
+        chunk_size: int = None,
+        account: str = None,
+        attachments: list = None,
+    ) -> dict:
+        """Send the same message to many receivers with as few requests as
+        possible, at most chunk_size receivers per request.
+
+        Returns a dict from receiver to the timestamp of the sent message, or to
+        the exception that occurred while sending to that receiver. File-like
+        attachments are sent to every chunk, so they must be seekable if there
+        is more than one chunk.
+        """
+        results = {}
+        resolved = {}  # receiver -> resolved receiver
+        for receiver in receivers:
+            try:
+                resolved[receiver] = self._resolve_receiver(receiver)
+            except SignalBotError as e:
+                results[receiver] = e
+
+        resolved_results = await self._send_chunks(
+            list(dict.fromkeys(resolved.values())),
+            text,
+            base64_attachments=base64_attachments,
+            mentions=mentions,
+            text_mode=text_mode,
+            chunk_size=chunk_size,
+            account=account,
+            attachments=attachments,
+        )
+        for receiver, resolved_receiver in resolved.items():
+            results[receiver] = resolved_results[resolved_receiver]
+
+        return results
+
+    async def _send_chunks(
+        self,
+        receivers: list[str],
+        text: str,
+        base64_attachments: list = None,
+        mentions: list = None,
+        text_mode: str = None,
+        chunk_size: int = None,
+        account: str = None,
+        attachments: list = None,
+    ) -> dict:
+        signal = self._signal_for(account)
+        if chunk_size is None:
+            chunk_size = self._send_max_recipients
+
+        async def send_chunk(chunk):
+            try:
+                resp = await signal.send_batch(
+                    chunk,
+                    text,
+                    base64_attachments=base64_attachments,
+                    mentions=mentions,
+                    text_mode=text_mode,
+                    attachments=attachments,
+                )
+                resp_payload = await resp.json()
+                timestamp = resp_payload["timestamp"]
+            except Exception as e:
+                return {receiver: e for receiver in chunk}
+
+            logging.info(
+                f"[Bot] New message {timestamp} sent to {len(chunk)} receivers:\n{text}"
+            )
+            return {receiver: timestamp for receiver in chunk}
+
+        results = {}
+        chunks = chunked(receivers, chunk_size)
+        files = [a for a in attachments or [] if hasattr(a, "read")]
+        if files:
+            # file-like attachments are read by one request at a time, every
+            # chunk reads them from where they were when send_batch was called
+            start_positions = []
+            for f in files:
+                if getattr(f, "seekable", lambda: False)():
+                    start_positions.append((f, f.tell()))
+                elif len(chunks) > 1:
+                    raise SignalBotError(
+                        "Attachments that are not seekable can only be sent "
+                        f"to at most {chunk_size} receivers"
+                    )
+            for chunk in chunks:
+                for f, position in start_positions:
+                    f.seek(position)
+                results.update(await send_chunk(chunk))
+            return results
+
+        for chunk_results in await asyncio.gather(*map(send_chunk, chunks)):
+            results.update(chunk_results)
+        return results
+
     async def react(self, message: Message, emoji: str):
         # TODO: check that emoji is really an emoji
         recipient = message.recipient()
         recipient = self._resolve_receiver(recipient)
         target_author = message.source
         timestamp = message.timestamp
-        await self._signal.react(recipient, emoji, target_author, timestamp)
+        signal = self._signal_for(message.account)
+        await signal.react(recipient, emoji, target_author, timestamp)
         logging.info(f"[Bot] New reaction: {emoji}")
 
-    async def start_typing(self, receiver: str):
+    async def start_typing(self, receiver: str, account: str = None):
+        receiver = self._resolve_receiver(receiver)
+        await self._signal_for(account).start_typing(receiver)
+
+    async def stop_typing(self, receiver: str, account: str = None):
         receiver = self._resolve_receiver(receiver)
-        await self._signal.start_typing(receiver)
+        await self._signal_for(account).stop_typing(receiver)
 
-    async def stop_typing(self, receiver: str):
+    def typing(self, receiver: str, account: str = None):
+        """Show a typing indicator while the block runs, refreshed until a
+        message is sent to the chat: async with bot.typing(receiver): ..."""
         receiver = self._resolve_receiver(receiver)
-        await self._signal.stop_typing(receiver)
+        return self.typing_indicators.typing(self._signal_for(account), receiver)
+
+    def download_attachment(
+        self,
+        attachment: Attachment | str,
+        account: str = None,
+        max_size: int = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream an attachment of a received message chunk by chunk:
+        async for chunk in bot.download_attachment(message.attachments[0])"""
+        attachment_id = getattr(attachment, "id", attachment)
+        signal = self._signal_for(account)
+        return signal.download_attachment(attachment_id, max_size=max_size)
+
+    async def save_attachment(
+        self,
+        attachment: Attachment | str,
+        path: str,
+        account: str = None,
+        max_size: int = None,
+    ) -> str:
+        attachment_id = getattr(attachment, "id", attachment)
+        signal = self._signal_for(account)
+        return await signal.save_attachment(attachment_id, path, max_size=max_size)
+
+    async def run_cpu_bound(
+        self, function: Callable, *args, timeout: float = None, **kwargs
+    ):
+        """Run function(*args, **kwargs) in the bot's process pool, so that
+        heavy computations do not block receiving and the other consumers.
+
+        Raises asyncio.TimeoutError after timeout seconds (default: the
+        executors.timeout config).
+        """
+        return await self.executors.run_cpu_bound(
+            function, *args, timeout=timeout, **kwargs
+        )
+
+    async def run_blocking(
+        self, function: Callable, *args, timeout: float = None, **kwargs
+    ):
+        """Same as .run_cpu_bound() but in the bot's thread pool, for blocking
+        I/O and functions that cannot be pickled"""
+        return await self.executors.run_blocking(
+            function, *args, timeout=timeout, **kwargs
+        )
+
+    def rate_limit_stats(self, account: str = None) -> dict:
+        """Acquired, delayed, retried and rejected outbound requests of an
+        account (default: phone_number)"""
+        return self._signal_for(account).rate_limiter.stats()
+
+    def queue_stats(self) -> dict:
+        """Depth, drops and enqueue wait times of the job queue. In sharded
+        mode the numbers are summed up over all shards. deferred counts the
+        jobs waiting for a command that runs max_concurrency times."""
+        deferred = sum(len(limit.backlog) for limit in self._command_limits.values())
+        if not self._sharded:
+            return {**self._q.stats(), "deferred": deferred}
+
+        shards = [q.stats() for q in self._queues]
+        enqueued = sum(shard["enqueued"] for shard in shards)
+        enqueue_wait_total = sum(q.enqueue_wait_total for q in self._queues)
+        return {
+            "depth": sum(shard["depth"] for shard in shards),
+            "maxsize": sum(shard["maxsize"] for shard in shards),
+            "enqueued": enqueued,
+            "dropped": sum(shard["dropped"] for shard in shards),
+            "enqueue_wait_avg": enqueue_wait_total / enqueued if enqueued else 0.0,
+            "enqueue_wait_max": max(shard["enqueue_wait_max"] for shard in shards),
+            "deferred": deferred,
+            "shards": shards,
+        }
 
     async def _detect_groups(self):
-        # reset group lookups to avoid stale data
-        self.groups = await self._signal.get_groups()
+        # accounts share the groups they are a member of, group ids are global
+        groups = []
+        known_ids = set()
+        signals = self._signals.values()
+        for account_groups in await asyncio.gather(*[s.get_groups() for s in signals]):
+            for group in account_groups:
+                if group["id"] not in known_ids:
+                    known_ids.add(group["id"])
+                    groups.append(group)
+
+        groups_hash = hashlib.sha1(
+            json.dumps(groups, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        if groups_hash == self._groups_hash:
+            logging.debug("[Bot] Groups did not change")
+            return
 
-        self._groups_by_id = {}
-        self._groups_by_internal_id = {}
-        self._groups_by_name = defaultdict(list)
-        for group in self.groups:
-            self._groups_by_id[group["id"]] = group
-            self._groups_by_internal_id[group["internal_id"]] = group
-            self._groups_by_name[group["name"]].append(group)
+        # build new lookups instead of resetting the old ones to avoid stale data
+        groups_by_id = {}
+        groups_by_internal_id = {}
+        groups_by_name = defaultdict(list)
+        for group in groups:
+            groups_by_id[group["id"]] = group
+            groups_by_internal_id[group["internal_id"]] = group
+            groups_by_name[group["name"]].append(group)
+
+        # swap all lookups at once, so readers never see a mix of old and new
+        (
+            self.groups,
+            self._groups_by_id,
+            self._groups_by_internal_id,
+            self._groups_by_name,
+            self._groups_hash,
+        ) = (groups, groups_by_id, groups_by_internal_id, groups_by_name, groups_hash)
+
+        for chat_filter in self._chat_filters:
+            chat_filter.resolve(groups_by_id, groups_by_name)
+        self._commands_by_chat.clear()
 
         logging.info(f"[Bot] {len(self.groups)} groups detected")
 
+    async def _refresh_groups(self):
+        try:
+            await self._detect_groups()
+        except Exception as e:
+            logging.warning(f"[Bot] Could not refresh groups: {e}")
+
+    async def _refresh_groups_if_unknown(self, message: Message):
+        """Refresh the groups if the message comes from a group the bot does
+        not know yet, at most once per cooldown. Waits for the refresh, so that
+        replies can be sent to the group and group filters apply, but at most
+        unknown_group_timeout seconds so that a slow REST API does not stall
+        receiving. The message is handled unresolved then."""
+        if not message.is_group() or message.group in self._groups_by_internal_id:
+            return
+
+        refresh = self._groups_refresh
+        if refresh is None or refresh.done():
+            now = time.monotonic()
+            if now - self._groups_refreshed_at < self._unknown_group_cooldown:
+                return
+
+            self._groups_refreshed_at = now
+            refresh = asyncio.create_task(self._refresh_groups())
+            self._groups_refresh = refresh
+
+        # shared by all producers waiting for it, it goes on after a timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(refresh), self._unknown_group_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"[Bot] Groups not refreshed after {self._unknown_group_timeout}s, "
+                f"handling message of unknown group {message.group}"
+            )
+
+    def _signal_for(self, account: Optional[str]) -> SignalAPI:
+        if account is None:
+            return self._signal
+
+        try:
+            return self._signals[account]
+        except KeyError:
+            raise SignalBotError(f"Unknown account: {account}")
+
     def _resolve_receiver(self, receiver: str) -> str:
         if self._is_phone_number(receiver):
             return receiver
@@ -309,38 +1044,75 @@ class SignalBot:
             logging.warning(f"Restarting coroutine in {sleep_t} seconds")
             await asyncio.sleep(sleep_t)
 
-    async def _produce_consume_messages(self, producers=1, consumers=3) -> None:
-        for n in range(1, producers + 1):
-            produce_task = self._rerun_on_exception(self._produce, n)
-            asyncio.create_task(produce_task)
+    async def _produce_consume_messages(self, producers=1) -> None:
+        role = self._distributed_role
+        if role in ("receiver", "both"):
+            n = 0
+            for account, receive_manager in self.receive_managers.items():
+                for _ in range(producers):
+                    n += 1
+                    produce_task = receive_manager.run(self._produce, n, account)
+                    self._tasks.append(asyncio.create_task(produce_task))
+
+        if self._distributed is not None:
+            if role in ("worker", "both"):
+                worker_task = self._rerun_on_exception(
+                    self._distributed.run_worker, self._handle_message
+                )
+                self._tasks.append(asyncio.create_task(worker_task))
+            return
 
-        for n in range(1, consumers + 1):
-            consume_task = self._rerun_on_exception(self._consume, n)
-            asyncio.create_task(consume_task)
+        for n in range(1, self._consumers + 1):
+            q = self._queues[n - 1] if self._sharded else self._q
+            consume_task = self._rerun_on_exception(self._consume, n, q)
+            self._tasks.append(asyncio.create_task(consume_task))
 
-    async def _produce(self, name: int) -> None:
-        logging.info(f"[Bot] Producer #{name} started")
+    async def _produce(self, name: int, account: str = None) -> None:
+        signal = self._signal_for(account)
+        receive_manager = self.receive_managers[signal.phone_number]
+        logging.info(f"[Bot] Producer #{name} for {signal.phone_number} started")
         try:
-            async for raw_message in self._signal.receive():
-                logging.info(f"[Raw Message] {raw_message}")
-
-                try:
-                    message = Message.parse(raw_message)
-                except UnknownMessageFormatError:
-                    continue
-
-                await self._ask_commands_to_handle(message)
+            if self._receive_mode == "poll":
+                batches = signal.poll(
+                    on_connect=receive_manager.connected, **self._poll_options
+                )
+            else:
+                receive = signal.receive(on_connect=receive_manager.connected)
+                batches = ([raw_message] async for raw_message in receive)
+
+            async for batch in batches:
+                received = []  # (message, raw_message)
+                for raw_message in batch:
+                    logging.info(f"[Raw Message] {raw_message}")
+                    self._received_metric.inc()
+
+                    try:
+                        message = Message.parse(raw_message, self._raw_message_policy)
+                    except UnknownMessageFormatError:
+                        self._parse_failures_metric.inc()
+                        continue
+                    message.account = signal.phone_number
+
+                    if receive_manager.is_duplicate(message):
+                        self._duplicates_metric.inc()
+                        continue
+
+                    await self._refresh_groups_if_unknown(message)
+                    received.append((message, raw_message))
+
+                if self._distributed is not None:
+                    for message, raw_message in received:
+                        await self._distributed.publish(message, raw_message)
+                else:
+                    await self._ask_commands_to_handle(
+                        *[message for message, _ in received]
+                    )
 
         except ReceiveMessagesError as e:
-            # TODO: retry strategy
+            # restarted by .receive_managers
             raise SignalBotError(f"Cannot receive messages: {e}")
 
-    def _should_react_for_contact(
-        self,
-        message: Message,
-        contacts: list[str] | bool,
-        group_ids: list[str] | bool,
-    ):
+    def _should_react_for_chat(self, message: Message, chat_filter: "_ChatFilter"):
         """Is the command activated for a certain chat or group?"""
 
         # Deprected Case: Listen Mode
@@ -353,28 +1125,23 @@ class SignalBot:
 
             return False
 
-        # Case 1: Private message
-        if message.is_private():
-            # a) registered for all numbers
-            if isinstance(contacts, bool) and contacts:
-                return True
-
-            # b) whitelisted numbers
-            if isinstance(contacts, list) and message.source in contacts:
-                return True
-
-        # Case 2: Group message
-        if message.is_group():
-            # a) registered for all groups
-            if isinstance(group_ids, bool) and group_ids:
-                return True
-
-            # b) whitelisted group ids
-            group_id = self._groups_by_internal_id.get(message.group, {}).get("id")
-            if isinstance(group_ids, list) and group_id and group_id in group_ids:
-                return True
-
-        return False
+        return chat_filter.allows(message)
+
+    def _chat_commands(self, message: Message) -> frozenset[int]:
+        """Positions of all commands that are activated for the chat of the
+        message, cached per chat until commands or groups change"""
+        key = (message.is_group(), message.recipient())
+        positions = self._commands_by_chat.get(key)
+        if positions is None:
+            positions = frozenset(
+                position
+                for position, chat_filter in enumerate(self._chat_filters)
+                if self._should_react_for_chat(message, chat_filter)
+            )
+            if len(self._commands_by_chat) >= CHAT_CACHE_SIZE:
+                self._commands_by_chat.clear()
+            self._commands_by_chat[key] = positions
+        return positions
 
     def _should_react_for_lambda(
         self,
@@ -386,39 +1153,207 @@ class SignalBot:
 
         return f(message)
 
-    async def _ask_commands_to_handle(self, message: Message):
-        for command, contacts, group_ids, f in self.commands:
-            if not self._should_react_for_contact(message, contacts, group_ids):
+    def _queue_for(self, message: Message) -> JobQueue:
+        if not self._sharded:
+            return self._q
+
+        chat = message.recipient() or ""
+        shard = zlib.crc32(chat.encode("utf-8")) % len(self._queues)
+        return self._queues[shard]
+
+    def _eligible_commands(self, message: Message):
+        """(command, route) of all commands that handle the message, route
+        is None for commands without @prefix or @regex"""
+        routes = self._router.match(message.text)
+        chat_commands = self._chat_commands(message)
+        for position in self._candidate_commands(message, routes):
+            if position not in chat_commands:
                 continue
 
+            command, _, _, f = self.commands[position]
             if not self._should_react_for_lambda(message, f):
                 continue
 
-            await self._q.put((command, message, time.perf_counter()))
+            yield command, routes.get(position)
+
+    async def _ask_commands_to_handle(self, *messages: Message):
+        """Queue the jobs of all messages of a batch at once"""
+        enqueue_t = time.perf_counter()
+        jobs = [
+            (self._queue_for(message), (command, message, enqueue_t, route))
+            for message in messages
+            for command, route in self._eligible_commands(message)
+        ]
+        for q, job in jobs:
+            await q.put(job)
+
+    async def _handle_message(self, message: Message):
+        """Handle a message from the distributed queue, one command after the
+        other so that the next message of the chat waits for this one"""
+        # workers do not see the receiver's refresh, they refresh themselves
+        await self._refresh_groups_if_unknown(message)
+        for command, route in list(self._eligible_commands(message)):
+            try:
+                await self._handle_job(command, message, route, defer=False)
+            except Exception:
+                continue
 
-    async def _consume(self, name: int) -> None:
+    async def _consume(self, name: int, q: JobQueue = None) -> None:
         logging.info(f"[Bot] Consumer #{name} started")
         while True:
             try:
-                await self._consume_new_item(name)
+                await self._consume_new_item(name, q)
             except Exception:
                 continue
 
-    async def _consume_new_item(self, name: int) -> None:
-        command, message, t = await self._q.get()
+    async def _consume_new_item(self, name: int, q: JobQueue = None) -> None:
+        if q is None:
+            q = self._q
+
+        command, message, t, route = await q.get()
         now = time.perf_counter()
         logging.info(f"[Bot] Consumer #{name} got new job in {now-t:0.5f} seconds")
+        self._queue_wait_metric.observe(now - t)
 
-        # handle Command
         try:
+            await self._handle_job(command, message, route)
+        finally:
+            q.task_done()
+
+    async def _handle_job(
+        self,
+        command: Command,
+        message: Message,
+        route: Route = None,
+        defer: bool = True,
+    ):
+        limit = self._command_limits.get(command)
+        if limit is None:
+            await self._run_job(command, message, route)
+            return
+
+        if defer and limit.semaphore.locked() and not limit.backlog_full():
+            # free the consumer, the job runs once an execution finishes. With
+            # a full backlog the consumer waits, so the job queue fills up and
+            # its overflow policy applies.
+            limit.backlog.append((message, route))
+            self._deferred_metric.inc(command=command.__class__.__name__)
+            return
+
+        async with limit.semaphore:
+            try:
+                await self._run_job(command, message, route)
+            finally:
+                while limit.backlog:
+                    message, route = limit.backlog.popleft()
+                    try:
+                        await self._run_job(command, message, route)
+                    except Exception:
+                        continue
+
+    async def _run_job(self, command: Command, message: Message, route: Route = None):
+        command_name = command.__class__.__name__
+        timeout = command.timeout
+        if timeout is None:
+            timeout = self._command_timeout
+
+        start_t = time.perf_counter()
+        if route is None:
             context = Context(self, message)
-            await command.handle(context)
+        else:
+            context = Context(self, message, args=route.args, match=route.match)
+        try:
+            if not await self._handle_with_deadline(command, context, timeout):
+                self._handle_timeouts_metric.inc(command=command_name)
+                logging.error(f"[{command_name}] Timed out after {timeout} seconds")
+                try:
+                    await command.on_timeout(context)
+                except Exception as e:
+                    logging.error(f"[{command_name}] Error in on_timeout: {e}")
         except Exception as e:
-            logging.error(f"[{command.__class__.__name__}] Error: {e}")
+            # a TimeoutError of the handler itself (e.g. aiohttp) is an error
+            self._handle_errors_metric.inc(command=command_name)
+            logging.error(f"[{command_name}] Error: {e}")
             raise e
+        finally:
+            duration = time.perf_counter() - start_t
+            self._handle_metric.observe(duration, command=command_name)
+
+    async def _handle_with_deadline(
+        self, command: Command, context: Context, timeout: float = None
+    ) -> bool:
+        """Run the handler, cancel it after timeout seconds. Returns False if
+        the deadline was hit, exceptions of the handler are raised."""
+        if timeout is None:
+            await command.handle(context)
+            return True
+
+        handle = asyncio.ensure_future(command.handle(context))
+        try:
+            done, _ = await asyncio.wait((handle,), timeout=timeout)
+        except asyncio.CancelledError:
+            handle.cancel()
+            raise
+
+        if not done:
+            handle.cancel()
+            await asyncio.gather(handle, return_exceptions=True)
+            return False
+        handle.result()
+        return True
+
+
+class _ChatFilter:
+    """Contacts and groups a command is registered for, True for all"""
+
+    __slots__ = ("contacts", "group_ids", "group_names", "internal_ids")
+
+    def __init__(
+        self,
+        contacts: list[str] | bool | None,
+        group_ids: list[str] | bool | None,
+        group_names: list[str],
+    ):
+        if not isinstance(contacts, bool):
+            contacts = frozenset(contacts or [])
+        if not isinstance(group_ids, bool):
+            group_ids = frozenset(group_ids or [])
+        self.contacts = contacts
+        self.group_ids = group_ids
+        self.group_names = tuple(group_names)
+        self.internal_ids = group_ids if isinstance(group_ids, bool) else frozenset()
+
+    def resolve(self, groups_by_id: dict, groups_by_name: dict):
+        """Messages name groups by internal id, look them up by id and name"""
+        if isinstance(self.group_ids, bool):
+            return
+
+        ids = set(self.group_ids)
+        for name in self.group_names:
+            ids.update(group["id"] for group in groups_by_name.get(name, []))
+        self.internal_ids = frozenset(
+            groups_by_id[id]["internal_id"] for id in ids if id in groups_by_id
+        )
+
+    def allows(self, message: Message) -> bool:
+        if message.is_group():
+            chats, chat = self.internal_ids, message.group
+        else:
+            chats, chat = self.contacts, message.source
+
+        if isinstance(chats, bool):
+            return chats
+        return chat in chats
+
+
+class _ConcurrencyLimit:
+    def __init__(self, max_concurrency: int, max_backlog: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.backlog = deque()  # deferred (message, route)
+        self.max_backlog = max_backlog
 
-        # done
-        self._q.task_done()
+    def backlog_full(self) -> bool:
+        return len(self.backlog) >= self.max_backlog
 
 
 class SignalBotError(Exception):
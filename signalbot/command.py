@@ -1,4 +1,5 @@
 import functools
+import re
 
 from .message import Message
 from .context import Context
@@ -22,16 +23,88 @@ def triggered(*by, case_sensitive=False):
 
             return await func(*args, **kwargs)
 
+        # exposed so that SignalBot can index commands by their trigger words
+        wrapper_triggered.triggers = by
+        wrapper_triggered.case_sensitive = case_sensitive
         return wrapper_triggered
 
     return decorator_triggered
 
 
+def prefix(*by, case_sensitive=False):
+    """Handle messages that start with one of the prefixes, followed by
+    whitespace or nothing. The words after the prefix are in context.args"""
+
+    def decorator_prefix(func):
+        @functools.wraps(func)
+        async def wrapper_prefix(*args, **kwargs):
+            c = args[1]
+            if c.args is None:
+                # not routed by SignalBot, e.g. handle() called directly
+                text = c.message.text
+                if not isinstance(text, str):
+                    return
+                compare = text if case_sensitive else text.lower()
+                for p in sorted(by, key=len, reverse=True):
+                    p = p if case_sensitive else p.lower()
+                    rest = text[len(p) :]
+                    if compare.startswith(p) and (not rest or rest[0].isspace()):
+                        c.args = rest.split()
+                        break
+                else:
+                    return
+
+            return await func(*args, **kwargs)
+
+        # exposed so that SignalBot can route messages to the command
+        wrapper_prefix.prefixes = by
+        wrapper_prefix.case_sensitive = case_sensitive
+        return wrapper_prefix
+
+    return decorator_prefix
+
+
+def regex(pattern: str | re.Pattern, flags: int = 0):
+    """Handle messages in which the pattern is found (re.search), the match
+    is in context.match"""
+    compiled = re.compile(pattern, flags)
+
+    def decorator_regex(func):
+        @functools.wraps(func)
+        async def wrapper_regex(*args, **kwargs):
+            c = args[1]
+            if c.match is None:
+                # not routed by SignalBot, e.g. handle() called directly
+                text = c.message.text
+                if not isinstance(text, str):
+                    return
+                c.match = compiled.search(text)
+                if c.match is None:
+                    return
+
+            return await func(*args, **kwargs)
+
+        # exposed so that SignalBot can route messages to the command
+        wrapper_regex.regex = compiled
+        return wrapper_regex
+
+    return decorator_regex
+
+
 class Command:
+    # optional, seconds until handle() is cancelled, None uses the bot default
+    timeout: float = None
+    # optional, max. concurrent handle() calls, None uses the bot default
+    max_concurrency: int = None
+
     # optional
     def setup(self):
         pass
 
+    # optional, called after handle() was cancelled because of the timeout
+    async def on_timeout(self, context: Context):
+        pass
+
     # optional
     def describe(self) -> str:
         return None
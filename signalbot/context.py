@@ -1,11 +1,18 @@
 # from .bot import Signalbot # TODO: figure out how to enable this for typing
-from .message import Message
+import re
+from typing import AsyncIterator, Callable
+
+from .message import Attachment, Message
 
 
 class Context:
-    def __init__(self, bot, message: Message):
+    def __init__(
+        self, bot, message: Message, args: list = None, match: re.Match = None
+    ):
         self.bot = bot
         self.message = message
+        self.args = args  # words after the prefix of a @prefix command
+        self.match = match  # match of a @regex command
 
     async def send(
         self,
@@ -13,6 +20,8 @@ class Context:
         base64_attachments: list = None,
         mentions: list = None,
         text_mode: str = None,
+        attachments: list = None,
+        wait: bool = True,
     ):
         return await self.bot.send(
             self.message.recipient(),
@@ -20,6 +29,9 @@ class Context:
             base64_attachments=base64_attachments,
             mentions=mentions,
             text_mode=text_mode,
+            account=self.message.account,
+            attachments=attachments,
+            wait=wait,
         )
 
     async def reply(
@@ -28,6 +40,8 @@ class Context:
         base64_attachments: list = None,
         mentions: list = None,
         text_mode: str = None,
+        attachments: list = None,
+        wait: bool = True,
     ):
         return await self.bot.send(
             self.message.recipient(),
@@ -39,13 +53,49 @@ class Context:
             quote_timestamp=self.message.timestamp,
             mentions=mentions,
             text_mode=text_mode,
+            account=self.message.account,
+            attachments=attachments,
+            wait=wait,
         )
 
     async def react(self, emoji: str):
         await self.bot.react(self.message, emoji)
 
     async def start_typing(self):
-        await self.bot.start_typing(self.message.recipient())
+        await self.bot.start_typing(
+            self.message.recipient(), account=self.message.account
+        )
 
     async def stop_typing(self):
-        await self.bot.stop_typing(self.message.recipient())
+        await self.bot.stop_typing(
+            self.message.recipient(), account=self.message.account
+        )
+
+    def typing(self):
+        """async with c.typing(): ... shows a typing indicator in the chat
+        until the block is done or a message is sent to the chat"""
+        return self.bot.typing(self.message.recipient(), account=self.message.account)
+
+    def download_attachment(
+        self, attachment: Attachment, max_size: int = None
+    ) -> AsyncIterator[bytes]:
+        return self.bot.download_attachment(
+            attachment, account=self.message.account, max_size=max_size
+        )
+
+    async def save_attachment(
+        self, attachment: Attachment, path: str, max_size: int = None
+    ) -> str:
+        return await self.bot.save_attachment(
+            attachment, path, account=self.message.account, max_size=max_size
+        )
+
+    async def run_cpu_bound(
+        self, function: Callable, *args, timeout: float = None, **kwargs
+    ):
+        return await self.bot.run_cpu_bound(function, *args, timeout=timeout, **kwargs)
+
+    async def run_blocking(
+        self, function: Callable, *args, timeout: float = None, **kwargs
+    ):
+        return await self.bot.run_blocking(function, *args, timeout=timeout, **kwargs)
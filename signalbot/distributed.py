@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+import zlib
+from typing import Awaitable, Callable
+
+from .message import Message, RawMessagePolicy
+
+# Extend the lease only if it is still owned by this worker
+RENEW_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Release the lease only if it is still owned by this worker
+RELEASE_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def assigned_partitions(workers: list[str], worker: str, partitions: int) -> set:
+    """Partitions a worker should own, given all live workers"""
+    workers = sorted(workers)
+    if worker not in workers:
+        return set()
+    index = workers.index(worker)
+    return {p for p in range(partitions) if p % len(workers) == index}
+
+
+class RedisStreamQueue:
+    """Work queue on top of Redis Streams with consumer groups
+
+    A receiver publishes every raw message to one of several partition
+    streams, chosen by a hash of the chat. Workers take part in a consumer
+    group per partition and acknowledge every entry after handling it.
+
+    To keep the messages of a chat in order, every partition is consumed by
+    one worker at a time. Live workers announce themselves with a heartbeat
+    and split the partitions between them, a worker owns a partition as long
+    as it holds its lease. Entries that a crashed worker read but did not
+    acknowledge are claimed by the next owner of the partition before it
+    reads new entries, so every message is handled at least once.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        stream: str = "signalbot:messages",
+        group: str = "signalbot",
+        partitions: int = 16,
+        consumer: str = None,
+        lease_timeout: float = 30.0,
+        maxlen: int = 100000,
+        block: float = 1.0,
+        raw_message_policy: RawMessagePolicy = RawMessagePolicy.LAZY,
+    ):
+        self.stream = stream
+        self.group = group
+        self.partitions = partitions
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.maxlen = maxlen
+        self.block = block
+        self.raw_message_policy = raw_message_policy
+
+        import redis.asyncio  # only loaded in distributed mode
+
+        self._redis = redis.asyncio.Redis(host=host, port=port, db=0)
+        self._renew_lease = self._redis.register_script(RENEW_LEASE)
+        self._release_lease = self._redis.register_script(RELEASE_LEASE)
+        self._tasks = {}  # partition -> task consuming it
+
+    def partition_for(self, message: Message) -> int:
+        return zlib.crc32(message.recipient().encode("utf-8")) % self.partitions
+
+    def _stream_key(self, partition: int) -> str:
+        return f"{self.stream}:{partition}"
+
+    def _lease_key(self, partition: int) -> str:
+        return f"{self.stream}:{partition}:lease"
+
+    def _workers_key(self) -> str:
+        return f"{self.stream}:workers"
+
+    async def publish(self, message: Message, raw_message: str | bytes | dict):
+        if isinstance(raw_message, dict):  # polled messages are decoded already
+            raw_message = json.dumps(raw_message)
+        fields = {"raw": raw_message, "account": message.account or ""}
+        await self._redis.xadd(
+            self._stream_key(self.partition_for(message)),
+            fields,
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    async def run_worker(self, handle: Callable[[Message], Awaitable]):
+        """Consume the partitions assigned to this worker until cancelled"""
+        logging.info(f"[Distributed] Worker {self.consumer} started")
+        try:
+            while True:
+                await self._rebalance(handle)
+                await asyncio.sleep(self.lease_timeout / 3)
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            for partition in list(self._tasks):
+                await self._release_lease(
+                    keys=[self._lease_key(partition)], args=[self.consumer]
+                )
+            self._tasks = {}
+            await self._redis.zrem(self._workers_key(), self.consumer)
+
+    async def close(self):
+        # redis>=5 renamed close() to aclose()
+        close = getattr(self._redis, "aclose", None) or self._redis.close
+        await close()
+
+    async def _rebalance(self, handle: Callable[[Message], Awaitable]):
+        now = time.time()
+        workers_key = self._workers_key()
+        await self._redis.zadd(workers_key, {self.consumer: now})
+        await self._redis.zremrangebyscore(
+            workers_key, "-inf", now - self.lease_timeout
+        )
+        workers = [
+            w.decode("utf-8") for w in await self._redis.zrange(workers_key, 0, -1)
+        ]
+        assigned = assigned_partitions(workers, self.consumer, self.partitions)
+        lease_ms = int(self.lease_timeout * 1000)
+
+        for partition, task in list(self._tasks.items()):
+            lease_key = self._lease_key(partition)
+            renewed = partition in assigned and not task.done()
+            if renewed:
+                renewed = await self._renew_lease(
+                    keys=[lease_key], args=[self.consumer, lease_ms]
+                )
+            if not renewed:
+                task.cancel()
+                del self._tasks[partition]
+                await self._release_lease(keys=[lease_key], args=[self.consumer])
+                logging.info(f"[Distributed] Released partition {partition}")
+
+        for partition in assigned - set(self._tasks):
+            acquired = await self._redis.set(
+                self._lease_key(partition), self.consumer, nx=True, px=lease_ms
+            )
+            if acquired:
+                logging.info(f"[Distributed] Acquired partition {partition}")
+                self._tasks[partition] = asyncio.create_task(
+                    self._consume_partition(partition, handle)
+                )
+
+    async def _consume_partition(
+        self, partition: int, handle: Callable[[Message], Awaitable]
+    ):
+        from redis.exceptions import ResponseError
+
+        stream_key = self._stream_key(partition)
+        try:
+            await self._redis.xgroup_create(
+                stream_key, self.group, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        # the lease guarantees that previous owners are gone, so take over
+        # everything they read but did not acknowledge
+        start_id = "0-0"
+        while True:
+            result = await self._redis.xautoclaim(
+                stream_key, self.group, self.consumer, 0, start_id, count=100
+            )
+            start_id, entries = result[0], result[1]
+            await self._handle_entries(stream_key, entries, handle)
+            if start_id in (b"0-0", "0-0"):
+                break
+
+        block_ms = int(self.block * 1000)
+        while True:
+            response = await self._redis.xreadgroup(
+                self.group,
+                self.consumer,
+                {stream_key: ">"},
+                count=100,
+                block=block_ms,
+            )
+            for _, entries in response:
+                await self._handle_entries(stream_key, entries, handle)
+
+    async def _handle_entries(
+        self, stream_key: str, entries: list, handle: Callable[[Message], Awaitable]
+    ):
+        for entry_id, fields in entries:
+            if fields:  # entries trimmed by maxlen are claimed without fields
+                try:
+                    message = Message.parse(fields[b"raw"], self.raw_message_policy)
+                    message.account = fields[b"account"].decode("utf-8") or None
+                    await handle(message)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    traceback.print_exc()
+            await self._redis.xack(stream_key, self.group, entry_id)
@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import logging
+from typing import Callable
+
+
+class Executors:
+    """Process and thread pools for work that would block the event loop
+
+    Both pools are created on first use. Functions run in the process pool
+    must be picklable, i.e. defined at the top level of a module, and so must
+    their arguments and return values.
+    """
+
+    def __init__(
+        self,
+        processes: int = None,
+        threads: int = None,
+        timeout: float = None,
+    ):
+        self.processes = processes  # None is the number of CPUs
+        self.threads = threads
+        self.timeout = timeout  # default seconds per call, None waits forever
+
+        self.timeouts = 0
+        self._process_pool = None
+        self._thread_pool = None
+
+    async def run_cpu_bound(
+        self, function: Callable, *args, timeout: float = None, **kwargs
+    ):
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.processes)
+        return await self._run(self._process_pool, function, args, kwargs, timeout)
+
+    async def run_blocking(
+        self, function: Callable, *args, timeout: float = None, **kwargs
+    ):
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.threads, thread_name_prefix="signalbot"
+            )
+        return await self._run(self._thread_pool, function, args, kwargs, timeout)
+
+    def shutdown(self):
+        """Cancel calls that did not start yet without waiting for running
+        ones. Work that already started is not interrupted, it finishes in
+        the background (the interpreter waits for it on exit)."""
+        for pool in (self._process_pool, self._thread_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._process_pool = None
+        self._thread_pool = None
+
+    async def _run(
+        self,
+        pool: Executor,
+        function: Callable,
+        args: tuple,
+        kwargs: dict,
+        timeout: float,
+    ):
+        if timeout is None:
+            timeout = self.timeout
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            pool, functools.partial(function, *args, **kwargs)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # a call that already started keeps its worker until it returns
+            self.timeouts += 1
+            logging.warning(
+                f"[Executors] {getattr(function, '__name__', function)} "
+                f"timed out after {timeout} seconds"
+            )
+            raise
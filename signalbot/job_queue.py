@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from enum import Enum
+from typing import Any, Callable, Optional
+
+
+class OverflowPolicy(Enum):
+    BLOCK = 1  # wait until a consumer frees a slot (backpressure)
+    DROP_OLDEST = 2  # discard the oldest queued job to make room
+    DROP_NEWEST = 3  # discard the job that is about to be queued
+
+
+class JobQueue(asyncio.Queue):
+    """asyncio.Queue with an overflow policy and enqueue statistics
+
+    A maxsize of 0 means the queue is unbounded and never overflows. Dropped
+    jobs are passed to on_drop, if given.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.BLOCK,
+        on_drop: Optional[Callable[[Any], None]] = None,
+    ):
+        super().__init__(maxsize)
+        self.overflow = overflow
+        self.on_drop = on_drop
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.enqueue_wait_total = 0.0  # seconds
+        self.enqueue_wait_max = 0.0  # seconds
+
+    async def put(self, item):
+        if self.full() and self.overflow is OverflowPolicy.DROP_NEWEST:
+            self._drop(item)
+            return
+
+        if self.full() and self.overflow is OverflowPolicy.DROP_OLDEST:
+            oldest = self.get_nowait()
+            self.task_done()
+            self._drop(oldest)
+
+        start_t = time.perf_counter()
+        await super().put(item)
+        wait_t = time.perf_counter() - start_t
+
+        self.enqueued += 1
+        self.enqueue_wait_total += wait_t
+        self.enqueue_wait_max = max(self.enqueue_wait_max, wait_t)
+
+    def stats(self) -> dict:
+        enqueue_wait_avg = 0.0
+        if self.enqueued > 0:
+            enqueue_wait_avg = self.enqueue_wait_total / self.enqueued
+
+        return {
+            "depth": self.qsize(),
+            "maxsize": self.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "enqueue_wait_avg": enqueue_wait_avg,
+            "enqueue_wait_max": self.enqueue_wait_max,
+        }
+
+    def _drop(self, item):
+        self.dropped += 1
+        logging.warning(
+            f"[JobQueue] Queue is full ({self.maxsize} jobs), dropped a job "
+            f"({self.overflow.name.lower()})"
+        )
+
+        if self.on_drop is None:
+            return
+
+        try:
+            self.on_drop(item)
+        except Exception as e:
+            logging.error(f"[JobQueue] on_drop callback failed: {e}")
@@ -1,13 +1,72 @@
-import json
 from enum import Enum
 
+from .serialization import loads
+
 
 class MessageType(Enum):
     SYNC_MESSAGE = 1
     DATA_MESSAGE = 2
 
 
+class RawMessagePolicy(Enum):
+    KEEP = 1  # decode the raw message and keep it on the message
+    LAZY = 2  # keep the raw json and decode it on first access
+    DROP = 3  # do not keep the raw message at all
+
+
+class Attachment:
+    """Metadata of a received attachment, download it with
+    SignalAPI.download_attachment(attachment.id)"""
+
+    __slots__ = ("id", "content_type", "filename", "size", "width", "height")
+
+    def __init__(
+        self,
+        id: str,
+        content_type: str = None,
+        filename: str = None,
+        size: int = None,
+        width: int = None,
+        height: int = None,
+    ):
+        self.id = id
+        self.content_type = content_type
+        self.filename = filename
+        self.size = size
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def parse(cls, attachment: dict):
+        return cls(
+            attachment["id"],
+            content_type=attachment.get("contentType"),
+            filename=attachment.get("filename"),
+            size=attachment.get("size"),
+            width=attachment.get("width"),
+            height=attachment.get("height"),
+        )
+
+    def __repr__(self):
+        return f"Attachment({self.id!r}, {self.content_type!r}, size={self.size!r})"
+
+
 class Message:
+    __slots__ = (
+        "source",
+        "timestamp",
+        "type",
+        "text",
+        "base64_attachments",
+        "group",
+        "reaction",
+        "mentions",
+        "account",
+        "attachments",
+        "_raw_message",
+        "_raw_message_encoded",
+    )
+
     def __init__(
         self,
         source: str,
@@ -19,6 +78,8 @@ class Message:
         reaction: str = None,
         mentions: list = None,
         raw_message: str = None,
+        account: str = None,
+        attachments: list = None,
     ):
         # required
         self.source = source
@@ -41,6 +102,24 @@ class Message:
 
         self.raw_message = raw_message
 
+        self.account = account  # phone number of the bot that received it
+
+        self.attachments = attachments
+        if self.attachments is None:
+            self.attachments = []
+
+    @property
+    def raw_message(self):
+        if self._raw_message_encoded:
+            self._raw_message = loads(self._raw_message)
+            self._raw_message_encoded = False
+        return self._raw_message
+
+    @raw_message.setter
+    def raw_message(self, raw_message):
+        self._raw_message = raw_message
+        self._raw_message_encoded = False
+
     def recipient(self) -> str:
         # Case 1: Group chat
         if self.group:
@@ -56,48 +135,68 @@ class Message:
         return bool(self.group)
 
     @classmethod
-    def parse(cls, raw_message: str):
-        try:
-            raw_message = json.loads(raw_message)
-        except Exception:
-            raise UnknownMessageFormatError
-
-        # General attributes
+    def parse(
+        cls,
+        raw_message: str | bytes | dict,
+        raw_message_policy: RawMessagePolicy = RawMessagePolicy.LAZY,
+    ):
         try:
-            source = raw_message["envelope"]["source"]
-            timestamp = raw_message["envelope"]["timestamp"]
+            if isinstance(raw_message, dict):  # already decoded, e.g. polled
+                decoded = raw_message
+            else:
+                decoded = loads(raw_message)
+            envelope = decoded["envelope"]
+            source = envelope["source"]
+            timestamp = envelope["timestamp"]
         except Exception:
             raise UnknownMessageFormatError
 
         # Option 1: syncMessage
-        if "syncMessage" in raw_message["envelope"]:
+        if "syncMessage" in envelope:
             type = MessageType.SYNC_MESSAGE
-            text = cls._parse_sync_message(raw_message["envelope"]["syncMessage"])
-            group = cls._parse_group_information(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
-            reaction = cls._parse_reaction(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
-            mentions = cls._parse_mentions(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
+            sync_message = envelope["syncMessage"]
+            if not isinstance(sync_message, dict):
+                raise UnknownMessageFormatError
+            content = sync_message.get("sentMessage")
 
         # Option 2: dataMessage
-        elif "dataMessage" in raw_message["envelope"]:
+        elif "dataMessage" in envelope:
             type = MessageType.DATA_MESSAGE
-            text = cls._parse_data_message(raw_message["envelope"]["dataMessage"])
-            group = cls._parse_group_information(raw_message["envelope"]["dataMessage"])
-            reaction = cls._parse_reaction(raw_message["envelope"]["dataMessage"])
-            mentions = cls._parse_mentions(raw_message["envelope"]["dataMessage"])
+            content = envelope["dataMessage"]
 
         else:
             raise UnknownMessageFormatError
 
-        # TODO: base64_attachments
+        if not isinstance(content, dict) or "message" not in content:
+            raise UnknownMessageFormatError
+
+        text = content["message"]
+
+        group = None
+        group_info = content.get("groupInfo")
+        if isinstance(group_info, dict):
+            group = group_info.get("groupId")
+
+        reaction = None
+        reaction_info = content.get("reaction")
+        if isinstance(reaction_info, dict):
+            reaction = reaction_info.get("emoji")
+
+        mentions = content.get("mentions")
+
+        # only metadata, the files are downloaded on demand
+        attachments = None
+        attachments_info = content.get("attachments")
+        if attachments_info:
+            attachments = [
+                Attachment.parse(attachment)
+                for attachment in attachments_info
+                if isinstance(attachment, dict) and "id" in attachment
+            ]
+
         base64_attachments = []
 
-        return cls(
+        message = cls(
             source,
             timestamp,
             type,
@@ -106,48 +205,17 @@ class Message:
             group,
             reaction,
             mentions,
-            raw_message,
+            account=decoded.get("account"),
+            attachments=attachments,
         )
 
-    @classmethod
-    def _parse_sync_message(cls, sync_message: dict) -> str:
-        try:
-            text = sync_message["sentMessage"]["message"]
-            return text
-        except Exception:
-            raise UnknownMessageFormatError
-
-    @classmethod
-    def _parse_data_message(cls, data_message: dict) -> str:
-        try:
-            text = data_message["message"]
-            return text
-        except Exception:
-            raise UnknownMessageFormatError
-
-    @classmethod
-    def _parse_group_information(self, message: dict) -> str:
-        try:
-            group = message["groupInfo"]["groupId"]
-            return group
-        except Exception:
-            return None
+        if raw_message_policy is RawMessagePolicy.KEEP:
+            message.raw_message = decoded
+        elif raw_message_policy is RawMessagePolicy.LAZY:
+            message._raw_message = raw_message
+            message._raw_message_encoded = decoded is not raw_message
 
-    @classmethod
-    def _parse_mentions(cls, data_message: dict) -> list:
-        try:
-            mentions = data_message["mentions"]
-            return mentions
-        except Exception:
-            return []
-
-    @classmethod
-    def _parse_reaction(self, message: dict) -> str:
-        try:
-            reaction = message["reaction"]["emoji"]
-            return reaction
-        except Exception:
-            return None
+        return message
 
     def __str__(self):
         if self.text is None:
@@ -0,0 +1,244 @@
+import bisect
+import logging
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> list:
+        """(suffix, labels, value) of every time series"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list:
+        return [("", key, value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Gauge that is either set explicitly or read from a function"""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        function: Callable[[], float] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list:
+        if self._function is not None:
+            return [("", (), self._function())]
+        return [("", key, value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., overflow count, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        values = self._values.get(key)
+        if values is None:
+            values = [0] * (len(self.buckets) + 3)
+            self._values[key] = values
+
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def count(self, **labels) -> int:
+        values = self._values.get(self._key(labels))
+        return values[-1] if values else 0
+
+    def samples(self) -> list:
+        samples = []
+        for key, values in self._values.items():
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, values):
+                cumulative += bucket_count
+                samples.append(("_bucket", key + (str(bucket),), cumulative))
+            samples.append(("_bucket", key + ("+Inf",), values[-1]))
+            samples.append(("_sum", key, values[-2]))
+            samples.append(("_count", key, values[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """Holds all metrics of a bot, metrics are created on first use"""
+
+    def __init__(self, prefix: str = "signalbot_"):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        function: Callable[[], float] = None,
+    ) -> Gauge:
+        return self._get(Gauge, name, help, labelnames, function=function)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def collect(self) -> list[Metric]:
+        return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            labelnames = metric.labelnames
+            if metric.type == "histogram":
+                labelnames += ("le",)
+            for suffix, key, value in metric.samples():
+                name = metric.name + suffix
+                if key:
+                    labels = ",".join(
+                        f'{labelname}="{_escape(label)}"'
+                        for labelname, label in zip(labelnames, key)
+                    )
+                    name = f"{name}{{{labels}}}"
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _get(self, cls, name: str, help: str, labelnames: tuple, **kwargs):
+        name = self.prefix + name
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, help, labelnames, **kwargs)
+            self._metrics[name] = metric
+        elif not isinstance(metric, cls):
+            raise MetricsError(f"{name} is already registered as {metric.type}")
+        return metric
+
+
+class MetricsExporter:
+    async def start(self, registry: MetricsRegistry):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class PrometheusExporter(MetricsExporter):
+    """Serve the metrics over HTTP from the bot's event loop"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9090, path="/metrics"):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._registry = None
+        self._runner = None
+
+    async def start(self, registry: MetricsRegistry):
+        from aiohttp import web  # only loaded if metrics are served
+
+        self._registry = registry
+        app = web.Application()
+        app.router.add_get(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logging.info(
+            f"[Metrics] Prometheus metrics on http://{self.host}:{self.port}{self.path}"
+        )
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+
+        return web.Response(
+            body=self._registry.render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+
+class MetricsError(Exception):
+    pass
+
+
+def _escape(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import zlib
+from typing import Awaitable, Callable
+
+
+class Outbox:
+    """Queue of outgoing messages served by a pool of sender tasks
+
+    submit() queues a send and returns a future of its result right away, so
+    a handler does not wait for the HTTP round trip. All sends to a chat go
+    to the same sender, they are sent one after the other in the order they
+    were submitted. Sends to different chats run in parallel.
+
+    A maxsize of 0 means the queue of every sender is unbounded, otherwise
+    submit() waits until the sender of the chat has room again.
+    """
+
+    def __init__(self, senders: int = 4, maxsize: int = 0):
+        self._queues = [asyncio.Queue(maxsize) for _ in range(max(1, senders))]
+        self._tasks = []  # started on first submit
+
+        self.submitted = 0
+        self.failed = 0
+
+    async def submit(self, chat: str, send: Callable[[], Awaitable]) -> asyncio.Future:
+        """Queue send() for the chat, returns a future of its result"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(q)) for q in self._queues]
+
+        future = asyncio.get_running_loop().create_future()
+        q = self._queues[zlib.crc32(chat.encode("utf-8")) % len(self._queues)]
+        await q.put((send, future))
+        self.submitted += 1
+        return future
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    async def join(self):
+        """Wait until all queued sends are done"""
+        for q in self._queues:
+            await q.join()
+
+    async def close(self, timeout: float = 10.0):
+        """Give queued sends timeout seconds to finish, cancel the rest"""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"[Outbox] {self.pending()} messages were not sent")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for q in self._queues:
+            while not q.empty():
+                _, future = q.get_nowait()
+                future.cancel()
+                q.task_done()
+
+    async def _run(self, q: asyncio.Queue):
+        while True:
+            send, future = await q.get()
+            try:
+                if future.cancelled():  # nobody waits for it anymore
+                    continue
+                result = await send()
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.warning(f"[Outbox] Could not send message: {e}")
+                if not future.done():
+                    # drop the frame of this loop from the traceback, clearing
+                    # it (e.g. by assertRaises) would finalize the sender
+                    future.set_exception(e.with_traceback(e.__traceback__.tb_next))
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                q.task_done()
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate  # tokens per second
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available"""
+        self._refill(now)
+        if self._tokens >= 1.0:
+            return 0.0
+        return (1.0 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """Token buckets for outbound requests, one shared by all requests and
+    one per recipient. Either of them can be disabled by passing no rate.
+
+    .backoff() pauses all requests, e.g. after a 429 Too Many Requests.
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: float = None,
+        per_recipient_rate: float = None,
+        per_recipient_burst: float = None,
+        max_tracked_recipients: int = 10000,
+    ):
+        self._bucket = None
+        if rate:
+            self._bucket = TokenBucket(rate, burst)
+
+        self._per_recipient_rate = per_recipient_rate
+        self._per_recipient_burst = per_recipient_burst
+        self._max_tracked_recipients = max_tracked_recipients
+        self._recipient_buckets = OrderedDict()  # recipient -> TokenBucket, LRU
+
+        self._paused_until = 0.0
+
+        self.acquired = 0
+        self.delayed = 0  # requests that had to wait for a token
+        self.wait_total = 0.0  # seconds
+        self.wait_max = 0.0  # seconds
+        self.rate_limited = 0  # 429 responses
+        self.retries = 0
+        self.rejected = 0  # requests that were still rate limited after retrying
+
+    async def acquire(self, recipients: Iterable[str] = ()):
+        start_t = time.monotonic()
+        buckets = [self._bucket] if self._bucket is not None else []
+        if self._per_recipient_rate:
+            buckets += [self._recipient_bucket(r) for r in recipients]
+
+        waited = False
+        while True:
+            now = time.monotonic()
+            delay = self._paused_until - now
+            for bucket in buckets:
+                delay = max(delay, bucket.delay(now))
+
+            if delay <= 0:
+                break
+            waited = True
+            await asyncio.sleep(delay)
+
+        for bucket in buckets:
+            bucket.take(now)
+
+        wait_t = now - start_t if waited else 0.0
+        self.acquired += 1
+        if waited:
+            self.delayed += 1
+        self.wait_total += wait_t
+        self.wait_max = max(self.wait_max, wait_t)
+
+    def backoff(self, seconds: float):
+        """Do not let any request through for the next seconds"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        wait_avg = self.wait_total / self.acquired if self.acquired else 0.0
+        return {
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "wait_avg": wait_avg,
+            "wait_max": self.wait_max,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+    def _recipient_bucket(self, recipient: str) -> TokenBucket:
+        bucket = self._recipient_buckets.get(recipient)
+        if bucket is None:
+            bucket = TokenBucket(self._per_recipient_rate, self._per_recipient_burst)
+            self._recipient_buckets[recipient] = bucket
+            if len(self._recipient_buckets) > self._max_tracked_recipients:
+                self._recipient_buckets.popitem(last=False)
+        else:
+            self._recipient_buckets.move_to_end(recipient)
+        return bucket
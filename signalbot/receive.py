@@ -0,0 +1,107 @@
+import asyncio
+from collections import OrderedDict
+from enum import Enum
+import inspect
+import logging
+import random
+import traceback
+from typing import Awaitable, Callable
+
+from .message import Message
+
+
+class ConnectionState(Enum):
+    CONNECTING = 1
+    CONNECTED = 2
+    DISCONNECTED = 3
+
+
+class ReceiveManager:
+    """Keep the receive connection alive
+
+    run() restarts the receive coroutine whenever it fails or the connection
+    is closed. Reconnects are attempted after a short random delay ("full
+    jitter") that grows exponentially with every failed attempt and is reset
+    as soon as a connection was established again.
+
+    Messages can be delivered again after a reconnect. is_duplicate()
+    remembers the (source, timestamp) of the last dedupe_window messages.
+    """
+
+    def __init__(
+        self,
+        min_delay: float = 0.5,
+        max_delay: float = 30.0,
+        dedupe_window: int = 1000,
+    ):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.dedupe_window = dedupe_window
+
+        self.state = ConnectionState.DISCONNECTED
+        self.reconnects = 0
+        self.duplicates = 0
+        self._attempt = 0
+        self._seen = OrderedDict()
+        self._callbacks = []
+
+    def add_state_callback(self, callback: Callable[[ConnectionState], Awaitable]):
+        """callback(state) is called on every state change, may be async"""
+        self._callbacks.append(callback)
+
+    async def run(self, receive: Callable[..., Awaitable], *args, **kwargs):
+        while True:
+            self._set_state(ConnectionState.CONNECTING)
+            try:
+                await receive(*args, **kwargs)
+                logging.warning("[Receive] Connection closed")
+            except asyncio.CancelledError:
+                self._set_state(ConnectionState.DISCONNECTED)
+                raise
+            except Exception:
+                traceback.print_exc()
+
+            self._set_state(ConnectionState.DISCONNECTED)
+            delay = self.next_delay()
+            logging.warning(f"[Receive] Reconnecting in {delay:0.2f} seconds")
+            await asyncio.sleep(delay)
+            self.reconnects += 1
+
+    def connected(self):
+        """Called by the receive coroutine once the connection is open"""
+        self._attempt = 0
+        self._set_state(ConnectionState.CONNECTED)
+
+    def next_delay(self) -> float:
+        cap = min(self.max_delay, self.min_delay * 2**self._attempt)
+        self._attempt += 1
+        return random.uniform(self.min_delay, max(self.min_delay, cap))
+
+    def is_duplicate(self, message: Message) -> bool:
+        if self.dedupe_window <= 0:
+            return False
+
+        key = (message.source, message.timestamp)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            self.duplicates += 1
+            return True
+
+        self._seen[key] = None
+        if len(self._seen) > self.dedupe_window:
+            self._seen.popitem(last=False)
+        return False
+
+    def _set_state(self, state: ConnectionState):
+        if state == self.state:
+            return
+
+        self.state = state
+        logging.info(f"[Receive] {state.name.lower()}")
+        for callback in self._callbacks:
+            try:
+                result = callback(state)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,145 @@
+import re
+
+# flags that can be scoped to a part of a pattern with (?flags:...)
+SCOPED_FLAGS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s"}
+# backreferences and global inline flags break when patterns are combined
+UNCOMBINABLE = re.compile(r"\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)")
+
+
+class Route:
+    """Result of routing a message to a @prefix or @regex command"""
+
+    __slots__ = ("args", "match")
+
+    def __init__(self, args: list = None, match: re.Match = None):
+        self.args = args
+        self.match = match
+
+
+class PrefixTrie:
+    def __init__(self):
+        self._root = {}
+        self._values = "__values__"  # cannot clash with single characters
+
+    def insert(self, prefix: str, value):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(self._values, []).append(value)
+
+    def matches(self, text: str) -> list[tuple[int, object]]:
+        """(length, value) of all inserted prefixes of text"""
+        matches = []
+        node = self._root
+        for length, char in enumerate(text):
+            for value in node.get(self._values, ()):
+                matches.append((length, value))
+            node = node.get(char)
+            if node is None:
+                return matches
+        for value in node.get(self._values, ()):
+            matches.append((len(text), value))
+        return matches
+
+
+class Router:
+    """Matches a message text against the @prefix and @regex commands at once
+
+    Prefixes are looked up in a trie, a prefix only matches if the text ends
+    after it or continues with whitespace. Regexes are combined into a single
+    pattern with one optional lookahead per regex, so one search tells which
+    of them match. Regexes that cannot be combined safely (backreferences,
+    named groups, flags other than IGNORECASE, MULTILINE and DOTALL) are
+    searched one by one.
+    """
+
+    def __init__(self):
+        self._prefixes = PrefixTrie()
+        self._lower_prefixes = PrefixTrie()
+        self._regexes = {}  # group name in the combined pattern -> (position, regex)
+        self._separate_regexes = []  # (position, regex)
+        self._combined = None
+
+    def add(self, position: int, handle) -> bool:
+        """Route the command at position if its handle is decorated with
+        @prefix or @regex, returns whether it was added"""
+        prefixes = getattr(handle, "prefixes", None)
+        if prefixes is not None:
+            if getattr(handle, "case_sensitive", False):
+                trie = self._prefixes
+            else:
+                trie = self._lower_prefixes
+                prefixes = [p.lower() for p in prefixes]
+            for prefix in set(prefixes):
+                trie.insert(prefix, position)
+            return True
+
+        regex = getattr(handle, "regex", None)
+        if regex is not None:
+            if self._can_combine(regex):
+                self._regexes[f"r{len(self._regexes)}"] = (position, regex)
+                self._combined = None  # compiled again on next match
+            else:
+                self._separate_regexes.append((position, regex))
+            return True
+
+        return False
+
+    def match(self, text: str) -> dict:
+        """Routes by position of all commands that match text"""
+        routes = {}
+        if not isinstance(text, str):
+            return routes
+
+        lower_text = text.lower()
+        if len(lower_text) != len(text):
+            # keep offsets intact for characters that lower to several ones
+            lower_text = "".join(c if len(c.lower()) > 1 else c.lower() for c in text)
+
+        prefix_lengths = {}  # position -> length of the longest matching prefix
+        for trie, candidate in (
+            (self._prefixes, text),
+            (self._lower_prefixes, lower_text),
+        ):
+            for length, position in trie.matches(candidate):
+                if length < len(text) and not text[length].isspace():
+                    continue
+                prefix_lengths[position] = max(length, prefix_lengths.get(position, 0))
+
+        for position, length in prefix_lengths.items():
+            routes[position] = Route(args=text[length:].split())
+
+        if self._regexes:
+            combined = self._combined_regex()
+            for name, value in combined.match(text).groupdict().items():
+                if value is not None:
+                    position, regex = self._regexes[name]
+                    routes[position] = Route(match=regex.search(text))
+
+        for position, regex in self._separate_regexes:
+            match = regex.search(text)
+            if match is not None:
+                routes[position] = Route(match=match)
+
+        return routes
+
+    def _combined_regex(self) -> re.Pattern:
+        if self._combined is None:
+            lookaheads = []
+            for name, (_, regex) in self._regexes.items():
+                flags = "".join(
+                    char for flag, char in SCOPED_FLAGS.items() if regex.flags & flag
+                )
+                pattern = f"(?{flags}:{regex.pattern})" if flags else regex.pattern
+                lookaheads.append(f"(?:(?=[\\s\\S]*?(?P<{name}>{pattern})))?")
+            self._combined = re.compile("".join(lookaheads))
+        return self._combined
+
+    @classmethod
+    def _can_combine(cls, regex: re.Pattern) -> bool:
+        if not isinstance(regex.pattern, str):
+            return False
+        if regex.groupindex or UNCOMBINABLE.search(regex.pattern):
+            return False
+        other_flags = regex.flags & ~(re.IGNORECASE | re.MULTILINE | re.DOTALL)
+        return other_flags & ~re.UNICODE == 0
@@ -0,0 +1,18 @@
+import json
+
+# Prefer a faster JSON library if one is installed. All of them accept str and
+# bytes and raise a subclass of ValueError for invalid input.
+try:
+    import orjson
+
+    JSON_LIBRARY = "orjson"
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+
+        JSON_LIBRARY = "ujson"
+        loads = ujson.loads
+    except ImportError:
+        JSON_LIBRARY = "json"
+        loads = json.loads
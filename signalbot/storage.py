@@ -1,5 +1,7 @@
-import redis
 import json
+import logging
+import time
+from collections import OrderedDict
 from typing import Any
 
 
@@ -14,6 +16,22 @@ class Storage:
         raise NotImplementedError
 
 
+class AsyncStorage:
+    """Storage that does not block the event loop, for use in Command.handle"""
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def read(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def save(self, key: str, object: Any):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
 class StorageError(Exception):
     pass
 
@@ -43,6 +61,8 @@ class InMemoryStorage(Storage):
 
 class RedisStorage(Storage):
     def __init__(self, host, port):
+        import redis  # only loaded if Redis is used
+
         self._redis = redis.Redis(host=host, port=port, db=0)
 
     def exists(self, key: str) -> bool:
@@ -63,3 +83,156 @@ class RedisStorage(Storage):
             self._redis.set(key, object_str)
         except Exception as e:
             raise StorageError(f"Redis save failed: {e}")
+
+
+class CachedStorage(Storage):
+    """Read-through cache in front of another Storage
+
+    Decoded objects are kept in an LRU cache of at most maxsize entries for
+    ttl seconds. Cached objects are shared between readers, so do not modify
+    them in place, save a new object instead. With write_behind, saves are
+    buffered and only written to the wrapped storage by .flush().
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        write_behind: bool = False,
+    ):
+        self._storage = storage
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._write_behind = write_behind
+
+        self._cache = OrderedDict()  # key -> (expiry time, object)
+        self._pending = {}  # key -> object, not yet written to self._storage
+
+        self.hits = 0
+        self.misses = 0
+
+    def exists(self, key: str) -> bool:
+        if key in self._pending or self._lookup(key) is not None:
+            return True
+        return self._storage.exists(key)
+
+    def read(self, key: str) -> Any:
+        if key in self._pending:
+            self.hits += 1
+            return self._pending[key]
+
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        object = self._storage.read(key)
+        self._remember(key, object)
+        return object
+
+    def save(self, key: str, object: Any):
+        if self._write_behind:
+            # fail early, like the wrapped storage would
+            try:
+                json.dumps(object)
+            except Exception as e:
+                raise StorageError(f"Cache save failed: {e}")
+            self._pending[key] = object
+        else:
+            self._storage.save(key, object)
+
+        self._remember(key, object)
+
+    def flush(self):
+        """Write all buffered saves to the wrapped storage"""
+        pending, self._pending = self._pending, {}
+
+        failed = 0
+        for key, object in pending.items():
+            try:
+                self._storage.save(key, object)
+            except StorageError as e:
+                logging.error(f"[CachedStorage] Flushing {key} failed: {e}")
+                failed += 1
+                self._pending.setdefault(key, object)  # retry on next flush
+
+        if failed > 0:
+            raise StorageError(f"Cache flush failed for {failed} keys")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "pending": len(self._pending),
+        }
+
+    def _lookup(self, key: str):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        if entry[0] < time.monotonic():
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return entry
+
+    def _remember(self, key: str, object: Any):
+        self._cache[key] = (time.monotonic() + self._ttl, object)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+
+
+class AsyncInMemoryStorage(AsyncStorage):
+    def __init__(self, storage: Storage = None):
+        # share the data with a synchronous storage, if given
+        self._storage = storage if storage is not None else InMemoryStorage()
+
+    async def exists(self, key: str) -> bool:
+        return self._storage.exists(key)
+
+    async def read(self, key: str) -> Any:
+        return self._storage.read(key)
+
+    async def save(self, key: str, object: Any):
+        self._storage.save(key, object)
+
+
+class AsyncRedisStorage(AsyncStorage):
+    def __init__(self, host, port, max_connections: int = None):
+        import redis.asyncio  # only loaded if Redis is used
+
+        self._pool = redis.asyncio.ConnectionPool(
+            host=host, port=port, db=0, max_connections=max_connections
+        )
+        self._redis = redis.asyncio.Redis(connection_pool=self._pool)
+
+    async def exists(self, key: str) -> bool:
+        return await self._redis.exists(key)
+
+    async def read(self, key: str) -> Any:
+        try:
+            result_bytes = await self._redis.get(key)
+            result_str = result_bytes.decode("utf-8")
+            result_dict = json.loads(result_str)
+            return result_dict
+        except Exception as e:
+            raise StorageError(f"Redis load failed: {e}")
+
+    async def save(self, key: str, object: Any):
+        try:
+            object_str = json.dumps(object)
+            await self._redis.set(key, object_str)
+        except Exception as e:
+            raise StorageError(f"Redis save failed: {e}")
+
+    async def close(self):
+        # redis>=5 renamed close() to aclose()
+        close = getattr(self._redis, "aclose", None) or self._redis.close
+        await close()
+        await self._pool.disconnect()
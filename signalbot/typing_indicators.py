@@ -0,0 +1,82 @@
+import asyncio
+import contextlib
+import logging
+
+
+class _Indicator:
+    __slots__ = ("holders", "refresh")
+
+    def __init__(self):
+        self.holders = 0
+        self.refresh = None  # task that keeps the indicator alive
+
+
+class TypingIndicators:
+    """One typing indicator per chat, shared by all handlers of the chat
+
+    Signal clients hide a typing indicator after a few seconds, so it is
+    started again every refresh_interval seconds as long as a handler holds
+    it. Overlapping holders in the same chat share one indicator, it is
+    stopped when the last one is done. Sending a message to the chat ends
+    the refreshing, clients hide the indicator when the message arrives.
+    """
+
+    def __init__(self, refresh_interval: float = 10.0):
+        self.refresh_interval = refresh_interval
+        self._indicators = {}  # (account, receiver) -> _Indicator
+
+    @contextlib.asynccontextmanager
+    async def typing(self, signal, receiver: str):
+        """Show the typing indicator in the chat while the block runs"""
+        key = (signal.phone_number, receiver)
+        indicator = self._indicators.get(key)
+        if indicator is None:
+            indicator = self._indicators[key] = _Indicator()
+        indicator.holders += 1
+        if indicator.refresh is None:
+            indicator.refresh = asyncio.create_task(self._refresh(signal, receiver))
+
+        try:
+            yield
+        finally:
+            indicator.holders -= 1
+            if indicator.holders == 0:
+                del self._indicators[key]
+                if indicator.refresh is not None:
+                    indicator.refresh.cancel()
+                    await self._stop(signal, receiver)
+
+    def sent(self, account: str, receiver: str):
+        """Called after a message was sent to the chat"""
+        indicator = self._indicators.get((account, receiver))
+        if indicator is not None and indicator.refresh is not None:
+            indicator.refresh.cancel()
+            indicator.refresh = None
+
+    def active(self, account: str, receiver: str) -> bool:
+        indicator = self._indicators.get((account, receiver))
+        return indicator is not None and indicator.refresh is not None
+
+    async def close(self):
+        """Stop refreshing all indicators, clients hide them after a while"""
+        tasks = []
+        for indicator in self._indicators.values():
+            if indicator.refresh is not None:
+                indicator.refresh.cancel()
+                tasks.append(indicator.refresh)
+                indicator.refresh = None
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _refresh(self, signal, receiver: str):
+        while True:
+            try:
+                await signal.start_typing(receiver)
+            except Exception as e:
+                logging.warning(f"[Typing] Could not start typing in {receiver}: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _stop(self, signal, receiver: str):
+        try:
+            await signal.stop_typing(receiver)
+        except Exception as e:
+            logging.warning(f"[Typing] Could not stop typing in {receiver}: {e}")
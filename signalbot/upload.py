@@ -0,0 +1,102 @@
+import base64
+import io
+import json
+import os
+from typing import AsyncIterator, Callable
+
+# multiple of 3, so that the base64 chunks can be concatenated
+CHUNK_SIZE = 3 * 16 * 1024
+
+# besides binary file-like objects
+ATTACHMENT_TYPES = (bytes, bytearray, memoryview, str, os.PathLike)
+
+
+def json_body_with_attachments(
+    payload: dict,
+    attachments: list,
+    chunk_size: int = CHUNK_SIZE,
+) -> Callable[[], AsyncIterator[bytes]]:
+    """JSON body of a send request that base64 encodes attachments on the fly
+
+    attachments are file paths, binary file-like objects or bytes. They are
+    appended to payload["base64_attachments"] while the body is sent, so at
+    most chunk_size bytes of every attachment are in memory at a time.
+
+    Returns a function that creates the body, every call starts from the
+    beginning so that a request can be retried. File-like objects that are
+    not seekable can only be sent once.
+    """
+    if chunk_size % 3 != 0:
+        raise ValueError("chunk_size must be a multiple of 3")
+
+    fields = {k: v for k, v in payload.items() if k != "base64_attachments"}
+    head = json.dumps(fields)[:-1]
+    if fields:
+        head += ", "
+    head += '"base64_attachments": ['
+    inline = [json.dumps(a) for a in payload.get("base64_attachments") or []]
+
+    start_positions = {}  # id(file) -> position of a seekable file-like
+    replayable = True
+    for attachment in attachments:
+        if not isinstance(attachment, ATTACHMENT_TYPES) and not _is_file_like(
+            attachment
+        ):
+            raise TypeError(f"Unsupported attachment: {type(attachment).__name__}")
+        if _is_file_like(attachment):
+            if getattr(attachment, "seekable", lambda: False)():
+                start_positions[id(attachment)] = attachment.tell()
+            else:
+                replayable = False
+    calls = 0
+
+    async def body() -> AsyncIterator[bytes]:
+        nonlocal calls
+        calls += 1
+        if calls > 1 and not replayable:
+            raise ValueError("Attachments that are not seekable can only be sent once")
+
+        yield head.encode("utf-8")
+        yield ", ".join(inline).encode("utf-8")
+
+        for i, attachment in enumerate(attachments):
+            yield b', "' if inline or i > 0 else b'"'
+            for chunk in _read_chunks(attachment, chunk_size, start_positions):
+                yield base64.b64encode(chunk)
+            yield b'"'
+
+        yield b"]}"
+
+    return body
+
+
+def _is_file_like(attachment) -> bool:
+    return hasattr(attachment, "read")
+
+
+def _read_chunks(attachment, chunk_size: int, start_positions: dict):
+    if isinstance(attachment, (bytes, bytearray, memoryview)):
+        view = memoryview(attachment)
+        for start in range(0, len(view), chunk_size):
+            yield view[start : start + chunk_size]
+
+    elif isinstance(attachment, (str, os.PathLike)):
+        with open(attachment, "rb") as f:
+            yield from _read_file(f, chunk_size)
+
+    else:
+        if id(attachment) in start_positions:
+            attachment.seek(start_positions[id(attachment)])
+        yield from _read_file(attachment, chunk_size)
+
+
+def _read_file(f: io.RawIOBase, chunk_size: int):
+    # read() may return less than asked for, base64 needs multiples of 3
+    buffer = b""
+    while chunk := f.read(chunk_size - len(buffer)):
+        buffer += chunk
+        if len(buffer) == chunk_size:
+            yield buffer
+            buffer = b""
+    if buffer:
+        yield buffer
@@ -26,7 +26,13 @@ def chat(*messages):
             receive_mock = args[1]
 
             receive_mock.define(messages)
-            await chat_test_case.run_bot()
+            # the group of the messages is looked up instead of requested
+            with patch(
+                f"{signalbot_package}.SignalAPI.get_groups",
+                new_callable=AsyncMock,
+                return_value=chat_test_case.groups,
+            ):
+                await chat_test_case.run_bot()
 
             value = func(*args, **kwargs)
             return value
@@ -42,6 +48,7 @@ class ChatTestCase(unittest.IsolatedAsyncioTestCase):
 
     group_id = "group_id1="
     group_secret = "group.group_secret1="
+    groups = [{"id": group_secret, "internal_id": group_id, "name": "Test group"}]
     config = {
         "signal_service": signal_service,
         "phone_number": phone_number,
@@ -57,6 +64,7 @@ class ChatTestCase(unittest.IsolatedAsyncioTestCase):
         await self.signal_bot._produce(PRODUCER_ID)
         while self.signal_bot._q.qsize() > 0:
             await self.signal_bot._consume_new_item(HANDLER_ID)
+        await self.signal_bot.outbox.join()  # replies sent with wait=False
 
     @classmethod
     def new_message(cls, text) -> str:
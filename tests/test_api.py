@@ -1,8 +1,22 @@
 import unittest
 import aiohttp
+import asyncio
+import base64
+import io
+import os
+import tempfile
+from aiohttp import web
 from unittest.mock import patch, AsyncMock
 
-from signalbot import SignalAPI
+from signalbot import (
+    SignalAPI,
+    AttachmentTooLargeError,
+    DownloadAttachmentError,
+    ReceiveMessagesError,
+    SendMessageError,
+)
+from signalbot.metrics import MetricsRegistry
+from signalbot.ratelimit import RateLimiter
 
 
 class TestAPI(unittest.IsolatedAsyncioTestCase):
@@ -16,6 +30,9 @@ class TestAPI(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.signal_api = SignalAPI(TestAPI.signal_service, TestAPI.phone_number)
 
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+
     @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
     async def test_send(self, mock):
         mock2 = AsyncMock()
@@ -32,6 +49,53 @@ class TestAPI(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(resp.status_code, 201)
 
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_send_reuses_session(self, mock):
+        await self.signal_api.send(TestAPI.group_id, "Hello")
+        session = self.signal_api.session
+        await self.signal_api.send(TestAPI.group_id, "World")
+        self.assertIs(self.signal_api.session, session)
+        self.assertEqual(mock.call_count, 2)
+
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_send_batch(self, mock):
+        receivers = ["+49123456781", "+49123456782"]
+        await self.signal_api.send_batch(receivers, "Hello")
+        payload = mock.call_args.kwargs["json"]
+        self.assertEqual(payload["recipients"], receivers)
+        self.assertEqual(payload["message"], "Hello")
+
+    async def test_session_connection_pool(self):
+        signal_api = SignalAPI(
+            TestAPI.signal_service,
+            TestAPI.phone_number,
+            connection_limit=10,
+            connection_limit_per_host=5,
+        )
+        await signal_api.open()
+        connector = signal_api.session.connector
+        self.assertEqual(connector.limit, 10)
+        self.assertEqual(connector.limit_per_host, 5)
+
+        await signal_api.close()
+        self.assertIsNone(signal_api.session)
+
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_no_session_after_close(self, mock):
+        # created lazily before the first .open()
+        await self.signal_api.send(TestAPI.group_id, "Hello")
+        self.assertIsNotNone(self.signal_api.session)
+
+        await self.signal_api.close()
+        with self.assertRaises(SendMessageError):
+            await self.signal_api.send(TestAPI.group_id, "World")
+        self.assertIsNone(self.signal_api.session)
+        self.assertEqual(mock.call_count, 1)
+
+        await self.signal_api.open()
+        await self.signal_api.send(TestAPI.group_id, "Again")
+        self.assertEqual(mock.call_count, 2)
+
     @patch("websockets.connect")
     async def test_receive(self, mock):
         message1 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Message 1","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group1","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
@@ -60,5 +124,201 @@ class TestAPI(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(actual_uri, expected_uri)
 
 
+class ServerTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs a fake signal-cli-rest-api, see serve()"""
+
+    signal_api = None
+    runner = None
+
+    async def serve(self, app: web.Application) -> str:
+        """Start app on a free port, returns its signal_service address"""
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        return f"{host}:{port}"
+
+    async def asyncTearDown(self):
+        if self.signal_api is not None:
+            await self.signal_api.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class TestDownloadAttachment(ServerTestCase):
+    phone_number = "+49123456789"
+    content = bytes(range(256)) * 1024  # 256 KiB
+
+    async def asyncSetUp(self):
+        self.downloads = 0
+
+        async def attachment(request):
+            self.downloads += 1
+            if request.match_info["id"] != "abc123.png":
+                return web.Response(status=404)
+            return web.Response(body=TestDownloadAttachment.content)
+
+        app = web.Application()
+        app.router.add_get("/v1/attachments/{id}", attachment)
+        signal_service = await self.serve(app)
+
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.signal_api = SignalAPI(
+            signal_service,
+            TestDownloadAttachment.phone_number,
+            attachment_cache_dir=self.cache_dir.name,
+        )
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.cache_dir.cleanup()
+
+    async def download(self, attachment_id: str, **kwargs) -> list:
+        chunks = []
+        stream = self.signal_api.download_attachment(attachment_id, **kwargs)
+        async for chunk in stream:
+            chunks.append(chunk)
+        return chunks
+
+    async def test_download_in_chunks(self):
+        chunks = await self.download("abc123.png", chunk_size=16 * 1024)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 16 * 1024 for chunk in chunks))
+        self.assertEqual(b"".join(chunks), TestDownloadAttachment.content)
+
+    async def test_download_is_cached(self):
+        await self.download("abc123.png")
+        chunks = await self.download("abc123.png")
+        self.assertEqual(b"".join(chunks), TestDownloadAttachment.content)
+        self.assertEqual(self.downloads, 1)
+
+    async def test_concurrent_downloads(self):
+        results = await asyncio.gather(
+            self.download("abc123.png", chunk_size=1024),
+            self.download("abc123.png", chunk_size=1024),
+        )
+        for chunks in results:
+            self.assertEqual(b"".join(chunks), TestDownloadAttachment.content)
+        self.assertEqual(os.listdir(self.cache_dir.name), ["abc123.png"])
+
+    async def test_metrics_group_attachment_ids(self):
+        self.signal_api.metrics = MetricsRegistry()
+        await self.download("abc123.png")
+        with self.assertRaises(DownloadAttachmentError):
+            await self.download("unknown.png")
+
+        text = self.signal_api.metrics.render_prometheus()
+        self.assertIn('endpoint="/v1/attachments/{id}"', text)
+        self.assertNotIn("abc123.png", text)
+        self.assertNotIn("unknown.png", text)
+
+    async def test_max_size(self):
+        with self.assertRaises(AttachmentTooLargeError):
+            await self.download("abc123.png", max_size=1024)
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    async def test_not_found(self):
+        with self.assertRaises(DownloadAttachmentError):
+            await self.download("unknown.png")
+
+    async def test_invalid_id(self):
+        with self.assertRaises(DownloadAttachmentError):
+            await self.download("../secret")
+        self.assertEqual(self.downloads, 0)
+
+    async def test_save_attachment(self):
+        path = os.path.join(self.cache_dir.name, "saved.png")
+        await self.signal_api.save_attachment("abc123.png", path)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), TestDownloadAttachment.content)
+
+
+class TestSendAttachments(ServerTestCase):
+    phone_number = "+49123456789"
+
+    async def asyncSetUp(self):
+        self.payloads = []
+
+        async def send(request):
+            self.payloads.append(await request.json())
+            if len(self.payloads) == 1:
+                return web.Response(status=429, headers={"Retry-After": "0"})
+            return web.json_response({"timestamp": "1638715559464"}, status=201)
+
+        app = web.Application()
+        app.router.add_post("/v2/send", send)
+        self.signal_api = SignalAPI(
+            await self.serve(app), TestSendAttachments.phone_number
+        )
+
+    async def test_streamed_attachment_is_resent_on_429(self):
+        content = os.urandom(200000)
+        resp = await self.signal_api.send(
+            "+49123456781", "Video", attachments=[io.BytesIO(content)]
+        )
+
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(len(self.payloads), 2)
+        for payload in self.payloads:
+            self.assertEqual(payload["message"], "Video")
+            self.assertEqual(
+                base64.b64decode(payload["base64_attachments"][0]), content
+            )
+
+
+class TestPoll(ServerTestCase):
+    phone_number = "+49123456789"
+    envelope = {"envelope": {"source": "+49123456781", "timestamp": 1}}
+
+    async def asyncSetUp(self):
+        self.batches = [[TestPoll.envelope, TestPoll.envelope], [], []]
+        self.queries = []
+
+        async def receive(request):
+            self.queries.append(dict(request.query))
+            batch = self.batches.pop(0) if self.batches else []
+            return web.json_response(batch)
+
+        app = web.Application()
+        app.router.add_get(f"/v1/receive/{TestPoll.phone_number}", receive)
+        self.signal_api = SignalAPI(await self.serve(app), TestPoll.phone_number)
+
+    async def test_receive_batch(self):
+        batch = await self.signal_api.receive_batch(timeout=2, max_messages=10)
+        self.assertEqual(batch, [TestPoll.envelope, TestPoll.envelope])
+        self.assertEqual(self.queries, [{"timeout": "2", "max_messages": "10"}])
+
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_poll_backs_off_while_idle(self, sleep_mock):
+        connected = []
+        poll = self.signal_api.poll(
+            on_connect=lambda: connected.append(True),
+            min_interval=0.5,
+            max_interval=1.5,
+        )
+
+        self.assertEqual(len(await poll.__anext__()), 2)
+        self.batches = [[], [], [TestPoll.envelope]]
+        self.assertEqual(len(await poll.__anext__()), 1)
+        await poll.aclose()
+
+        delays = [call.args[0] for call in sleep_mock.call_args_list]
+        self.assertEqual(delays, [0.5, 1.0, 1.5])
+        self.assertEqual(connected, [True])
+
+    async def test_not_rate_limited(self):
+        self.signal_api.rate_limiter = RateLimiter(rate=0.001, burst=1)
+        self.signal_api.rate_limiter.backoff(60)  # e.g. after a 429 on a send
+
+        batch = await asyncio.wait_for(self.signal_api.receive_batch(), 1)
+        self.assertEqual(len(batch), 2)
+
+    async def test_unexpected_response(self):
+        self.batches = [{"error": "websocket mode"}]
+        with self.assertRaises(ReceiveMessagesError):
+            await self.signal_api.receive_batch()
+
+
 if __name__ == "__main__":
     unittest.main()
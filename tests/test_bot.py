@@ -1,7 +1,21 @@
 import unittest
 import asyncio
+import io
+import json
 from unittest.mock import patch, AsyncMock
-from signalbot import SignalBot, Command, SignalAPI
+from signalbot import (
+    SignalBot,
+    Command,
+    Context,
+    SignalAPI,
+    Message,
+    MessageType,
+    triggered,
+)
+from signalbot.api import SendMessageError
+from signalbot.bot import SignalBotError
+from signalbot.storage import CachedStorage, InMemoryStorage, StorageError
+from signalbot.utils import SendMessagesMock
 
 
 class BotTestCase(unittest.IsolatedAsyncioTestCase):
@@ -17,13 +31,18 @@ class BotTestCase(unittest.IsolatedAsyncioTestCase):
         }
         self.signal_bot = SignalBot(config)
 
+    async def asyncTearDown(self):
+        await self.signal_bot._signal.close()
+        for signal in self.signal_bot._signals.values():
+            await signal.close()
+
 
 class TestProducer(BotTestCase):
     @patch("websockets.connect")
     async def test_produce(self, mock):
         # Two messages
         message1 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Message 1","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
-        message2 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Message 2","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
+        message2 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000001,"syncMessage":{"sentMessage":{"timestamp":1633169000001,"message":"Message 2","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
         messages = [message1, message2]
         mock_iterator = AsyncMock()
         mock_iterator.__aiter__.return_value = messages
@@ -42,6 +61,634 @@ class TestProducer(BotTestCase):
 
         self.assertEqual(self.signal_bot._q.qsize(), 4)
 
+    @patch("websockets.connect")
+    async def test_produce_only_enqueues_triggered_commands(self, mock):
+        message = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Ping","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = [message]
+        mock.return_value.__aenter__.return_value = mock_iterator
+
+        class PingCommand(Command):
+            @triggered("ping")
+            async def handle(self, c):
+                pass
+
+        class PongCommand(Command):
+            @triggered("pong")
+            async def handle(self, c):
+                pass
+
+        self.signal_bot._q = asyncio.Queue()
+        self.signal_bot._signal = SignalAPI(
+            TestProducer.signal_service, TestProducer.phone_number
+        )
+        self.signal_bot.listen(TestProducer.group_id, TestProducer.internal_id)
+        ping = PingCommand()
+        self.signal_bot.register(ping)
+        self.signal_bot.register(PongCommand())
+        self.signal_bot.register(Command())
+
+        await self.signal_bot._produce(1337)
+
+        self.assertEqual(self.signal_bot._q.qsize(), 2)
+        command, _, _, _ = await self.signal_bot._q.get()
+        self.assertIs(command, ping)
+
+
+class TestPollProducer(BotTestCase):
+    envelope = {
+        "envelope": {
+            "source": "+4901234567890",
+            "timestamp": 1633169000000,
+            "dataMessage": {"timestamp": 1633169000000, "message": "Hello"},
+        }
+    }
+
+    def setUp(self):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "receive": {"mode": "poll"},
+        }
+        self.signal_bot = SignalBot(config)
+
+    async def test_produce_batch(self):
+        second = {"envelope": dict(TestPollProducer.envelope["envelope"])}
+        second["envelope"]["timestamp"] += 1
+
+        async def poll(on_connect=None, **kwargs):
+            on_connect()
+            yield [TestPollProducer.envelope, second, TestPollProducer.envelope]
+
+        self.signal_bot._q = asyncio.Queue()
+        self.signal_bot.register(Command())
+        with patch.object(self.signal_bot._signal, "poll", poll):
+            await self.signal_bot._produce(1)
+
+        # the redelivered message is dropped
+        self.assertEqual(self.signal_bot._q.qsize(), 2)
+        _, message, _, _ = await self.signal_bot._q.get()
+        self.assertEqual(message.account, BotTestCase.phone_number)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(SignalBotError):
+            SignalBot(
+                {
+                    "signal_service": BotTestCase.signal_service,
+                    "phone_number": BotTestCase.phone_number,
+                    "receive": {"mode": "carrier pigeon"},
+                }
+            )
+
+
+class TestDetectGroups(BotTestCase):
+    groups = [
+        {
+            "id": BotTestCase.group_id,
+            "internal_id": BotTestCase.internal_id,
+            "name": "Group 1",
+        }
+    ]
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_detect_groups(self, get_groups_mock):
+        get_groups_mock.return_value = TestDetectGroups.groups
+        await self.signal_bot._detect_groups()
+
+        self.assertIn(BotTestCase.group_id, self.signal_bot._groups_by_id)
+        self.assertIn(BotTestCase.internal_id, self.signal_bot._groups_by_internal_id)
+        self.assertEqual(len(self.signal_bot._groups_by_name["Group 1"]), 1)
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_unchanged_groups_are_not_rebuilt(self, get_groups_mock):
+        get_groups_mock.return_value = TestDetectGroups.groups
+        await self.signal_bot._detect_groups()
+        groups_by_id = self.signal_bot._groups_by_id
+
+        await self.signal_bot._detect_groups()
+        self.assertIs(self.signal_bot._groups_by_id, groups_by_id)
+
+        get_groups_mock.return_value = []
+        await self.signal_bot._detect_groups()
+        self.assertEqual(self.signal_bot._groups_by_id, {})
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_unknown_group_triggers_refresh(self, get_groups_mock):
+        get_groups_mock.return_value = TestDetectGroups.groups
+        message = Message(
+            "+49123456789",
+            1,
+            MessageType.DATA_MESSAGE,
+            "Hello",
+            group=BotTestCase.internal_id,
+        )
+
+        await asyncio.gather(
+            self.signal_bot._refresh_groups_if_unknown(message),
+            self.signal_bot._refresh_groups_if_unknown(message),
+        )
+
+        self.assertEqual(get_groups_mock.call_count, 1)
+        self.assertIn(BotTestCase.internal_id, self.signal_bot._groups_by_internal_id)
+        # the group is known before the message is handled
+        self.assertEqual(
+            self.signal_bot._resolve_receiver(message.recipient()),
+            BotTestCase.group_id,
+        )
+
+        # known group, no refresh
+        self.signal_bot._groups_refreshed_at = float("-inf")
+        await self.signal_bot._refresh_groups_if_unknown(message)
+        self.assertEqual(get_groups_mock.call_count, 1)
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_unknown_group_cooldown(self, get_groups_mock):
+        get_groups_mock.return_value = []
+        message = Message(
+            "+49123456789",
+            1,
+            MessageType.DATA_MESSAGE,
+            "Hello",
+            group=BotTestCase.internal_id,
+        )
+
+        await self.signal_bot._refresh_groups_if_unknown(message)
+        await self.signal_bot._refresh_groups_if_unknown(message)
+        self.assertEqual(get_groups_mock.call_count, 1)
+
+    async def test_slow_unknown_group_refresh(self):
+        release = asyncio.Event()
+
+        async def get_groups():
+            await release.wait()
+            return TestDetectGroups.groups
+
+        self.signal_bot._unknown_group_timeout = 0.01
+        message = Message(
+            "+49123456789",
+            1,
+            MessageType.DATA_MESSAGE,
+            "Hello",
+            group=BotTestCase.internal_id,
+        )
+
+        with patch.object(self.signal_bot._signal, "get_groups", get_groups):
+            # gives up waiting, the refresh goes on
+            await asyncio.wait_for(
+                self.signal_bot._refresh_groups_if_unknown(message), 1
+            )
+            self.assertNotIn(
+                BotTestCase.internal_id, self.signal_bot._groups_by_internal_id
+            )
+
+            release.set()
+            await self.signal_bot._groups_refresh
+        self.assertIn(BotTestCase.internal_id, self.signal_bot._groups_by_internal_id)
+
+
+class TestMultipleAccounts(BotTestCase):
+    second_number = "+49123456780"
+
+    def setUp(self):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "accounts": [TestMultipleAccounts.second_number],
+        }
+        self.signal_bot = SignalBot(config)
+        self.second_signal = self.signal_bot._signals[
+            TestMultipleAccounts.second_number
+        ]
+
+    def test_one_client_per_account(self):
+        self.assertEqual(len(self.signal_bot._signals), 2)
+        self.assertEqual(
+            self.second_signal.phone_number, TestMultipleAccounts.second_number
+        )
+        self.assertEqual(len(self.signal_bot.receive_managers), 2)
+
+    def test_one_rate_limiter_per_account(self):
+        primary = self.signal_bot._signal.rate_limiter
+        self.assertIsNot(self.second_signal.rate_limiter, primary)
+
+        self.second_signal.rate_limiter.backoff(60)
+        self.second_signal.rate_limiter.rate_limited += 1
+        self.assertEqual(self.signal_bot.rate_limit_stats()["rate_limited"], 0)
+        self.assertEqual(
+            self.signal_bot.rate_limit_stats(TestMultipleAccounts.second_number)[
+                "rate_limited"
+            ],
+            1,
+        )
+
+    @patch("websockets.connect")
+    async def test_produce_sets_account(self, mock):
+        message = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"dataMessage":{"timestamp":1633169000000,"message":"Message","expiresInSeconds":0,"viewOnce":false}}}'  # noqa
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = [message]
+        mock.return_value.__aenter__.return_value = mock_iterator
+        self.signal_bot.register(Command())
+
+        await self.signal_bot._produce(1, TestMultipleAccounts.second_number)
+
+        _, message, _, _ = await self.signal_bot._q.get()
+        self.assertEqual(message.account, TestMultipleAccounts.second_number)
+
+    async def test_reply_uses_receiving_account(self):
+        message = Message(
+            "+4901234567890",
+            1,
+            MessageType.DATA_MESSAGE,
+            "Hello",
+            account=TestMultipleAccounts.second_number,
+        )
+        context = Context(self.signal_bot, message)
+
+        with patch.object(
+            self.second_signal, "send", new_callable=SendMessagesMock
+        ) as send_mock:
+            await context.send("Hi")
+
+        self.assertEqual(send_mock.call_count, 1)
+
+    async def test_unknown_account(self):
+        with self.assertRaises(SignalBotError):
+            await self.signal_bot.send("+4901234567890", "Hi", account="+491")
+
+    async def test_detect_groups_of_all_accounts(self):
+        group1 = {"id": "group.1", "internal_id": "1", "name": "Group 1"}
+        group2 = {"id": "group.2", "internal_id": "2", "name": "Group 2"}
+        with patch.object(
+            self.signal_bot._signal, "get_groups", AsyncMock(return_value=[group1])
+        ), patch.object(
+            self.second_signal,
+            "get_groups",
+            AsyncMock(return_value=[group1, group2]),
+        ):
+            await self.signal_bot._detect_groups()
+
+        self.assertEqual(self.signal_bot.groups, [group1, group2])
+
+
+class TestShardedConsumers(BotTestCase):
+    def setUp(self):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "consumers": {"count": 4, "mode": "sharded"},
+        }
+        self.signal_bot = SignalBot(config)
+
+    def test_one_queue_per_consumer(self):
+        self.assertEqual(len(self.signal_bot._queues), 4)
+
+    def test_same_chat_same_queue(self):
+        message1 = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "1")
+        message2 = Message("+49123456789", 2, MessageType.DATA_MESSAGE, "2")
+        self.assertIs(
+            self.signal_bot._queue_for(message1),
+            self.signal_bot._queue_for(message2),
+        )
+
+    async def test_chat_handled_in_order(self):
+        handled = []
+
+        class OrderCommand(Command):
+            async def handle(self, c):
+                handled.append(c.message.text)
+
+        self.signal_bot.listen("+49123456789")
+        self.signal_bot.register(OrderCommand())
+        for i in range(5):
+            message = Message("+49123456789", i, MessageType.DATA_MESSAGE, str(i))
+            await self.signal_bot._ask_commands_to_handle(message)
+
+        q = self.signal_bot._queue_for(message)
+        self.assertEqual(self.signal_bot.queue_stats()["depth"], 5)
+        while q.qsize() > 0:
+            await self.signal_bot._consume_new_item(1, q)
+        self.assertEqual(handled, ["0", "1", "2", "3", "4"])
+
+
+class TestCommandLimits(BotTestCase):
+    async def test_timeout(self):
+        timed_out = []
+
+        class HangingCommand(Command):
+            timeout = 0.01
+
+            async def handle(self, c):
+                await asyncio.Event().wait()
+
+            async def on_timeout(self, c):
+                timed_out.append(c.message.text)
+
+        command = HangingCommand()
+        self.signal_bot.register(command)
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "Hello")
+
+        await self.signal_bot._handle_job(command, message)
+
+        self.assertEqual(timed_out, ["Hello"])
+        timeouts = self.signal_bot.metrics.counter("command_timeouts_total", "")
+        self.assertEqual(timeouts.value(command="HangingCommand"), 1)
+
+    async def test_default_timeout(self):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "commands": {"timeout": 0.01},
+        }
+        signal_bot = SignalBot(config)
+
+        class HangingCommand(Command):
+            async def handle(self, c):
+                await asyncio.Event().wait()
+
+        command = HangingCommand()
+        signal_bot.register(command)
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "Hello")
+
+        await asyncio.wait_for(signal_bot._handle_job(command, message), 1)
+
+    async def test_timeout_error_of_the_handler(self):
+        timed_out = []
+
+        class TimeoutCommand(Command):
+            async def handle(self, c):
+                raise asyncio.TimeoutError
+
+            async def on_timeout(self, c):
+                timed_out.append(c.message.text)
+
+        command = TimeoutCommand()
+        self.signal_bot.register(command)
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "Hello")
+
+        for timeout in (None, 1):
+            command.timeout = timeout
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.signal_bot._run_job(command, message)
+
+        # not a deadline of the command, but an error
+        self.assertEqual(timed_out, [])
+        timeouts = self.signal_bot.metrics.counter("command_timeouts_total", "")
+        self.assertEqual(timeouts.value(command="TimeoutCommand"), 0)
+        errors = self.signal_bot.metrics.counter("command_errors_total", "")
+        self.assertEqual(errors.value(command="TimeoutCommand"), 2)
+
+    async def test_max_concurrency_defers_jobs(self):
+        running = 0
+        max_running = 0
+        handled = []
+        release = asyncio.Event()
+
+        class SlowCommand(Command):
+            max_concurrency = 1
+
+            async def handle(self, c):
+                nonlocal running, max_running
+                running += 1
+                max_running = max(max_running, running)
+                await release.wait()
+                handled.append(c.message.text)
+                running -= 1
+
+        command = SlowCommand()
+        self.signal_bot.register(command)
+        messages = [
+            Message("+49123456789", i, MessageType.DATA_MESSAGE, str(i))
+            for i in range(3)
+        ]
+
+        first = asyncio.create_task(self.signal_bot._handle_job(command, messages[0]))
+        await asyncio.sleep(0)
+        # the other jobs are deferred and return at once
+        await self.signal_bot._handle_job(command, messages[1])
+        await self.signal_bot._handle_job(command, messages[2])
+        self.assertEqual(handled, [])
+
+        release.set()
+        await first
+        self.assertEqual(handled, ["0", "1", "2"])
+        self.assertEqual(max_running, 1)
+
+    async def test_full_backlog_blocks_the_consumer(self):
+        signal_bot = SignalBot(
+            {
+                "signal_service": BotTestCase.signal_service,
+                "phone_number": BotTestCase.phone_number,
+                "commands": {"max_concurrency": 1, "max_backlog": 1},
+            }
+        )
+        handled = []
+        release = asyncio.Event()
+
+        class SlowCommand(Command):
+            async def handle(self, c):
+                await release.wait()
+                handled.append(c.message.text)
+
+        command = SlowCommand()
+        signal_bot.register(command)
+        messages = [
+            Message("+49123456789", i, MessageType.DATA_MESSAGE, str(i))
+            for i in range(3)
+        ]
+
+        first = asyncio.create_task(signal_bot._handle_job(command, messages[0]))
+        await asyncio.sleep(0)
+        await signal_bot._handle_job(command, messages[1])  # deferred
+        self.assertEqual(signal_bot.queue_stats()["deferred"], 1)
+
+        third = asyncio.create_task(signal_bot._handle_job(command, messages[2]))
+        await asyncio.sleep(0.01)
+        self.assertFalse(third.done())
+
+        release.set()
+        await asyncio.gather(first, third)
+        self.assertEqual(handled, ["0", "1", "2"])
+        self.assertEqual(signal_bot.queue_stats()["deferred"], 0)
+
+
+class TestStorage(BotTestCase):
+    @patch("signalbot.bot.AsyncRedisStorage", side_effect=ImportError)
+    @patch("signalbot.bot.RedisStorage")
+    def test_no_redis_asyncio(self, redis_storage_mock, async_redis_storage_mock):
+        signal_bot = SignalBot(
+            {
+                "signal_service": BotTestCase.signal_service,
+                "phone_number": BotTestCase.phone_number,
+                "storage": {"redis_host": "localhost", "redis_port": 6379},
+            }
+        )
+
+        # still persisted in Redis, not silently in memory
+        self.assertIs(signal_bot.storage, redis_storage_mock.return_value)
+        self.assertIs(signal_bot.async_storage._storage, signal_bot.storage)
+
+
+class TestShutdown(BotTestCase):
+    async def test_failed_storage_flush(self):
+        class BrokenStorage(InMemoryStorage):
+            def save(self, key, object):
+                raise StorageError("offline")
+
+        self.signal_bot.storage = CachedStorage(BrokenStorage(), write_behind=True)
+        self.signal_bot.storage.save("key", {"value": 1})
+        await self.signal_bot._signal.open()
+
+        await self.signal_bot._shutdown()
+        self.assertIsNone(self.signal_bot._signal.session)
+
+    async def test_cancels_producers_and_consumers(self):
+        async def receive(on_connect=None):
+            on_connect()
+            await asyncio.Event().wait()
+            yield
+
+        await self.signal_bot._signal.open()
+        with patch.object(self.signal_bot._signal, "receive", receive):
+            await self.signal_bot._produce_consume_messages()
+            await asyncio.sleep(0)
+            tasks = list(self.signal_bot._tasks)
+            self.assertEqual(len(tasks), 1 + self.signal_bot._consumers)
+
+            await self.signal_bot._shutdown()
+
+        self.assertTrue(all(task.done() for task in tasks))
+        self.assertEqual(self.signal_bot._tasks, [])
+
+        # no new session is opened that nobody would close
+        with self.assertRaises(SendMessageError):
+            await self.signal_bot._signal.send("+49123456781", "Hello")
+        self.assertIsNone(self.signal_bot._signal.session)
+
+
+class TestSendBatch(BotTestCase):
+    receivers = ["+49123456781", "+49123456782", "+49123456783"]
+
+    @patch("signalbot.SignalAPI.send_batch", new_callable=SendMessagesMock)
+    async def test_send_batch_chunks(self, send_mock):
+        results = await self.signal_bot.send_batch(
+            TestSendBatch.receivers, "Hello", chunk_size=2
+        )
+
+        self.assertEqual(send_mock.call_count, 2)
+        self.assertEqual(send_mock.call_args_list[0][0][0], TestSendBatch.receivers[:2])
+        self.assertEqual(send_mock.call_args_list[1][0][0], TestSendBatch.receivers[2:])
+        self.assertEqual(set(results), set(TestSendBatch.receivers))
+        self.assertEqual(results["+49123456781"], "1638715559464")
+
+    @patch("signalbot.SignalAPI.send_batch", new_callable=SendMessagesMock)
+    async def test_send_batch_unresolvable_receiver(self, send_mock):
+        results = await self.signal_bot.send_batch(["+49123456781", "foo"], "Hello")
+
+        self.assertEqual(send_mock.call_count, 1)
+        self.assertEqual(results["+49123456781"], "1638715559464")
+        self.assertIsInstance(results["foo"], Exception)
+
+    async def test_send_batch_file_attachment_to_every_chunk(self):
+        bodies = []
+
+        async def request(method, uri, recipients, data_factory=None, **kwargs):
+            body = b"".join([chunk async for chunk in data_factory()])
+            bodies.append(json.loads(body))
+            return await SendMessagesMock()()
+
+        attachment = io.BytesIO(b"skipped hello world")
+        attachment.seek(len("skipped "))
+        with patch.object(self.signal_bot._signal, "_request", request):
+            results = await self.signal_bot.send_batch(
+                TestSendBatch.receivers, "Hello", attachments=[attachment], chunk_size=2
+            )
+
+        self.assertEqual(
+            [body["recipients"] for body in bodies],
+            [TestSendBatch.receivers[:2], TestSendBatch.receivers[2:]],
+        )
+        for body in bodies:
+            self.assertEqual(body["base64_attachments"], ["aGVsbG8gd29ybGQ="])
+        self.assertEqual(results[TestSendBatch.receivers[2]], "1638715559464")
+
+    @patch("signalbot.SignalAPI.send_batch", new_callable=SendMessagesMock)
+    async def test_send_batch_unseekable_file_attachment(self, send_mock):
+        class Unseekable(io.RawIOBase):
+            def readable(self):
+                return True
+
+            def readinto(self, b):
+                return 0
+
+        with self.assertRaises(SignalBotError):
+            await self.signal_bot.send_batch(
+                TestSendBatch.receivers,
+                "Hello",
+                attachments=[Unseekable()],
+                chunk_size=2,
+            )
+        send_mock.assert_not_called()
+
+        results = await self.signal_bot.send_batch(
+            TestSendBatch.receivers, "Hello", attachments=[Unseekable()]
+        )
+        self.assertEqual(send_mock.call_count, 1)
+        self.assertEqual(results[TestSendBatch.receivers[0]], "1638715559464")
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    async def test_send_without_waiting(self, send_mock):
+        futures = [
+            await self.signal_bot.send(r, "Hello", wait=False)
+            for r in TestSendBatch.receivers
+        ]
+        self.assertTrue(all(isinstance(f, asyncio.Future) for f in futures))
+
+        timestamps = await asyncio.gather(*futures)
+        self.assertEqual(timestamps, ["1638715559464"] * 3)
+        self.assertEqual(send_mock.call_count, 3)
+        await self.signal_bot.outbox.close()
+
+    async def test_shutdown_sends_queued_messages_first(self):
+        sessions = []
+
+        async def send(receiver, text, **kwargs):
+            await asyncio.sleep(0.01)
+            sessions.append(self.signal_bot._signal.session)
+            return await SendMessagesMock()()
+
+        with patch.object(self.signal_bot._signal, "send", send):
+            await self.signal_bot._signal.open()
+            futures = [
+                await self.signal_bot.send(r, "Hello", wait=False)
+                for r in TestSendBatch.receivers[:2]
+            ]
+            await self.signal_bot._shutdown()
+
+        self.assertEqual(
+            [f.result() for f in futures], ["1638715559464", "1638715559464"]
+        )
+        self.assertTrue(all(session is not None for session in sessions))
+        self.assertIsNone(self.signal_bot._signal.session)
+
+    @patch("signalbot.SignalAPI.send_batch", new_callable=SendMessagesMock)
+    async def test_send_coalesces_identical_messages(self, send_mock):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "send": {"coalesce_window": 0.01},
+        }
+        signal_bot = SignalBot(config)
+
+        timestamps = await asyncio.gather(
+            *[signal_bot.send(r, "Hello") for r in TestSendBatch.receivers],
+            signal_bot.send(TestSendBatch.receivers[0], "Hello"),
+            signal_bot.send(TestSendBatch.receivers[0], "World"),
+        )
+
+        self.assertEqual(send_mock.call_count, 2)
+        self.assertEqual(send_mock.call_args_list[0][0][0], TestSendBatch.receivers)
+        self.assertEqual(timestamps, ["1638715559464"] * 5)
+
 
 class TestListenUser(BotTestCase):
     def test_listen_phone_number(self):
@@ -121,3 +768,91 @@ class TestRegisterCommand(BotTestCase):
 
         self.signal_bot.register(cmd)
         self.assertEqual(cmd.state, True)
+
+    def test_register_indexes_trigger_words(self):
+        class TriggeredCommand(Command):
+            @triggered("Hello", "World", case_sensitive=True)
+            async def handle(self, c):
+                pass
+
+        class TriggeredLowerCommand(Command):
+            @triggered("Hello")
+            async def handle(self, c):
+                pass
+
+        self.signal_bot.register(TriggeredCommand())
+        self.signal_bot.register(TriggeredLowerCommand())
+        self.signal_bot.register(Command())
+
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "Hello")
+        self.assertEqual(self.signal_bot._candidate_commands(message), [0, 1, 2])
+        message.text = "hello"
+        self.assertEqual(self.signal_bot._candidate_commands(message), [1, 2])
+        message.text = "World"
+        self.assertEqual(self.signal_bot._candidate_commands(message), [0, 2])
+        message.text = "world"
+        self.assertEqual(self.signal_bot._candidate_commands(message), [2])
+
+
+class TestChatFilters(BotTestCase):
+    other_number = "+49987654321"
+    groups = [
+        {
+            "id": BotTestCase.group_id,
+            "internal_id": BotTestCase.internal_id,
+            "name": "Group 1",
+        }
+    ]
+
+    def eligible(self, message: Message) -> list:
+        return [command for command, _ in self.signal_bot._eligible_commands(message)]
+
+    def test_contacts(self):
+        command = Command()
+        self.signal_bot.register(command, contacts=[BotTestCase.phone_number])
+
+        message = Message(BotTestCase.phone_number, 1, MessageType.DATA_MESSAGE, "Hi")
+        self.assertEqual(self.eligible(message), [command])
+        message.source = TestChatFilters.other_number
+        self.assertEqual(self.eligible(message), [])
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_group_name_is_resolved_after_detection(self, get_groups_mock):
+        get_groups_mock.return_value = TestChatFilters.groups
+        command = Command()
+        self.signal_bot.register(command, contacts=False, groups=["Group 1"])
+        message = Message(
+            BotTestCase.phone_number,
+            1,
+            MessageType.DATA_MESSAGE,
+            "Hi",
+            group=BotTestCase.internal_id,
+        )
+        self.assertEqual(self.eligible(message), [])
+
+        await self.signal_bot._detect_groups()
+        self.assertEqual(self.eligible(message), [command])
+
+        get_groups_mock.return_value = []
+        await self.signal_bot._detect_groups()
+        self.assertEqual(self.eligible(message), [])
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_group_name_is_resolved_on_register(self, get_groups_mock):
+        get_groups_mock.return_value = TestChatFilters.groups
+        await self.signal_bot._detect_groups()
+
+        self.signal_bot.register(Command(), groups=["Group 1", "Group 2"])
+        _, _, group_ids, _ = self.signal_bot.commands[0]
+        self.assertEqual(group_ids, [BotTestCase.group_id])
+
+    def test_cache_is_invalidated_on_register(self):
+        message = Message(BotTestCase.phone_number, 1, MessageType.DATA_MESSAGE, "Hi")
+        first = Command()
+        self.signal_bot.register(first)
+        self.assertEqual(self.eligible(message), [first])
+
+        second = Command()
+        self.signal_bot.register(second)
+        self.assertEqual(self.eligible(message), [first, second])
+        self.assertEqual(len(self.signal_bot._commands_by_chat), 1)
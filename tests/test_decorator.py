@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import patch
 import logging
-from signalbot import Command, Context, triggered
+from signalbot import Command, Context, triggered, prefix, regex
 from signalbot.utils import ChatTestCase, SendMessagesMock, ReceiveMessagesMock
 
 
@@ -23,6 +23,18 @@ class TriggeredCaseSensitiveCommand(Command):
         await c.send("I am triggered")
 
 
+class WeatherCommand(Command):
+    @prefix("/weather", "/w")
+    async def handle(self, c: Context):
+        await c.send(f"Weather in {' '.join(c.args)}")
+
+
+class DiceCommand(Command):
+    @regex(r"roll (\d+)d(\d+)")
+    async def handle(self, c: Context):
+        await c.send(f"Rolling {c.match.group(1)} dice")
+
+
 class TriggeredTest(ChatTestCase):
     def setUp(self):
         super().setUp()
@@ -74,6 +86,59 @@ class TriggeredCaseSensitiveTest(ChatTestCase):
         self.assertEqual(send_mock.call_count, 0)
 
 
+class PrefixTest(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        group = {"id": "asdf", "name": "Test"}
+        self.signal_bot._groups_by_internal_id = {"group_id1=": group}
+        self.signal_bot.register(WeatherCommand())
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    @patch("signalbot.SignalAPI.receive", new_callable=ReceiveMessagesMock)
+    async def test_prefix(self, receive_mock, send_mock):
+        receive_mock.define(["/Weather Berlin Mitte"])
+        await self.run_bot()
+        self.assertEqual(send_mock.call_count, 1)
+        self.assertEqual(send_mock.call_args[0][1], "Weather in Berlin Mitte")
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    @patch("signalbot.SignalAPI.receive", new_callable=ReceiveMessagesMock)
+    async def test_prefix_without_args(self, receive_mock, send_mock):
+        receive_mock.define(["/w"])
+        await self.run_bot()
+        self.assertEqual(send_mock.call_args[0][1], "Weather in ")
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    @patch("signalbot.SignalAPI.receive", new_callable=ReceiveMessagesMock)
+    async def test_not_prefixed(self, receive_mock, send_mock):
+        receive_mock.define(["/weatherman", "the /weather"])
+        await self.run_bot()
+        self.assertEqual(send_mock.call_count, 0)
+
+
+class RegexTest(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        group = {"id": "asdf", "name": "Test"}
+        self.signal_bot._groups_by_internal_id = {"group_id1=": group}
+        self.signal_bot.register(DiceCommand())
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    @patch("signalbot.SignalAPI.receive", new_callable=ReceiveMessagesMock)
+    async def test_regex(self, receive_mock, send_mock):
+        receive_mock.define(["please roll 3d6"])
+        await self.run_bot()
+        self.assertEqual(send_mock.call_count, 1)
+        self.assertEqual(send_mock.call_args[0][1], "Rolling 3 dice")
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    @patch("signalbot.SignalAPI.receive", new_callable=ReceiveMessagesMock)
+    async def test_no_match(self, receive_mock, send_mock):
+        receive_mock.define(["roll the dice"])
+        await self.run_bot()
+        self.assertEqual(send_mock.call_count, 0)
+
+
 if __name__ == "__main__":
     logging.basicConfig(level="INFO")
     unittest.main()
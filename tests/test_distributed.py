@@ -0,0 +1,144 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+from signalbot import SignalBot, Command, Message, MessageType
+from signalbot.bot import SignalBotError
+from signalbot.distributed import RedisStreamQueue, assigned_partitions
+
+
+class TestAssignedPartitions(unittest.TestCase):
+    def test_partitions_are_split_between_workers(self):
+        workers = ["worker-b", "worker-a", "worker-c"]
+        assigned = [assigned_partitions(workers, w, 16) for w in workers]
+
+        self.assertEqual(set().union(*assigned), set(range(16)))
+        self.assertEqual(sum(len(a) for a in assigned), 16)
+
+    def test_unknown_worker(self):
+        self.assertEqual(assigned_partitions(["worker-a"], "worker-b", 16), set())
+
+
+class TestRedisStreamQueue(unittest.IsolatedAsyncioTestCase):
+    raw_message = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"dataMessage":{"timestamp":1633169000000,"message":"Message","expiresInSeconds":0,"viewOnce":false}}}'  # noqa
+
+    async def asyncSetUp(self):
+        self.queue = RedisStreamQueue("127.0.0.1", 6379, partitions=4)
+        self.queue._redis = AsyncMock()
+
+    def test_same_chat_same_partition(self):
+        message1 = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "1")
+        message2 = Message("+49123456789", 2, MessageType.DATA_MESSAGE, "2")
+        self.assertEqual(
+            self.queue.partition_for(message1), self.queue.partition_for(message2)
+        )
+
+    async def test_publish(self):
+        message = Message.parse(TestRedisStreamQueue.raw_message)
+        await self.queue.publish(message, TestRedisStreamQueue.raw_message)
+
+        stream_key, fields = self.queue._redis.xadd.call_args[0]
+        partition = self.queue.partition_for(message)
+        self.assertEqual(stream_key, f"signalbot:messages:{partition}")
+        self.assertEqual(fields["raw"], TestRedisStreamQueue.raw_message)
+
+    async def test_entries_are_acknowledged_after_handling(self):
+        handled = []
+
+        async def handle(message):
+            handled.append(message)
+            raise Exception("handling failed")
+
+        raw = TestRedisStreamQueue.raw_message.encode("utf-8")
+        entries = [
+            (b"1-0", {b"raw": raw, b"account": b"+49123456789"}),
+            (b"2-0", {}),  # trimmed
+        ]
+        with patch("traceback.print_exc"):
+            await self.queue._handle_entries("stream:0", entries, handle)
+
+        self.assertEqual(len(handled), 1)
+        self.assertEqual(handled[0].text, "Message")
+        self.assertEqual(handled[0].account, "+49123456789")
+        self.assertEqual(self.queue._redis.xack.call_count, 2)
+
+
+class TestDistributedBot(unittest.IsolatedAsyncioTestCase):
+    config = {
+        "signal_service": "127.0.0.1:8080",
+        "phone_number": "+49123456789",
+        "storage": {"redis_host": "127.0.0.1", "redis_port": 6379},
+        "distributed": {"partitions": 4},
+    }
+
+    def test_needs_redis_storage(self):
+        config = dict(TestDistributedBot.config)
+        del config["storage"]
+        with self.assertRaises(SignalBotError):
+            SignalBot(config)
+
+    def test_unknown_role(self):
+        config = dict(TestDistributedBot.config, distributed={"role": "boss"})
+        with self.assertRaises(SignalBotError):
+            SignalBot(config)
+
+    @patch("websockets.connect")
+    async def test_produce_publishes(self, mock):
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = [TestRedisStreamQueue.raw_message]
+        mock.return_value.__aenter__.return_value = mock_iterator
+
+        signal_bot = SignalBot(TestDistributedBot.config)
+        signal_bot.register(Command())
+        signal_bot._distributed.publish = AsyncMock()
+
+        await signal_bot._produce(1)
+
+        self.assertEqual(signal_bot._distributed.publish.call_count, 1)
+        self.assertEqual(signal_bot._q.qsize(), 0)
+
+    async def test_handle_message_runs_commands_in_order(self):
+        handled = []
+
+        class FirstCommand(Command):
+            async def handle(self, c):
+                handled.append("first")
+                raise Exception("first failed")
+
+        class SecondCommand(Command):
+            async def handle(self, c):
+                handled.append("second")
+
+        signal_bot = SignalBot(TestDistributedBot.config)
+        signal_bot.register(FirstCommand())
+        signal_bot.register(SecondCommand())
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "Hello")
+
+        await signal_bot._handle_message(message)
+
+        self.assertEqual(handled, ["first", "second"])
+
+    @patch("signalbot.SignalAPI.get_groups", new_callable=AsyncMock)
+    async def test_handle_message_refreshes_unknown_group(self, get_groups_mock):
+        get_groups_mock.return_value = [
+            {"id": "group.group_secret1=", "internal_id": "group_id1=", "name": "A"}
+        ]
+        handled = []
+
+        class GroupCommand(Command):
+            async def handle(self, c):
+                handled.append(c.bot._resolve_receiver(c.message.recipient()))
+
+        config = dict(TestDistributedBot.config, distributed={"role": "worker"})
+        signal_bot = SignalBot(config)
+        signal_bot.register(GroupCommand(), contacts=False, groups=["A"])
+        message = Message(
+            "+49123456789", 1, MessageType.DATA_MESSAGE, "Hello", group="group_id1="
+        )
+
+        await signal_bot._handle_message(message)
+
+        self.assertEqual(get_groups_mock.call_count, 1)
+        self.assertEqual(handled, ["group.group_secret1="])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import asyncio
+import threading
+import time
+from signalbot import SignalBot, Command, Context, Message, MessageType
+from signalbot.executors import Executors
+
+
+def fibonacci(n: int) -> int:
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+
+class TestExecutors(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.executors = Executors(processes=1, threads=1)
+
+    async def asyncTearDown(self):
+        self.executors.shutdown()
+
+    async def test_run_cpu_bound(self):
+        self.assertEqual(await self.executors.run_cpu_bound(fibonacci, 20), 6765)
+
+    async def test_run_blocking(self):
+        thread_name = await self.executors.run_blocking(
+            lambda: threading.current_thread().name
+        )
+        self.assertTrue(thread_name.startswith("signalbot"))
+
+    async def test_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.executors.run_blocking(time.sleep, 0.2, timeout=0.01)
+        self.assertEqual(self.executors.timeouts, 1)
+
+    async def test_default_timeout(self):
+        self.executors.timeout = 0.01
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.executors.run_blocking(time.sleep, 0.2)
+
+    async def test_shutdown_does_not_wait_for_running_calls(self):
+        started = threading.Event()
+
+        def work():
+            started.set()
+            time.sleep(0.3)
+
+        future = asyncio.ensure_future(self.executors.run_blocking(work))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+
+        start_t = time.perf_counter()
+        self.executors.shutdown()
+        self.assertLess(time.perf_counter() - start_t, 0.1)
+        await future
+
+
+class TestContextExecutors(unittest.IsolatedAsyncioTestCase):
+    async def test_command_runs_cpu_bound_work(self):
+        signal_bot = SignalBot(
+            {
+                "signal_service": "127.0.0.1:8080",
+                "phone_number": "+49123456789",
+                "executors": {"processes": 1},
+            }
+        )
+        results = []
+
+        class FibonacciCommand(Command):
+            async def handle(self, c: Context):
+                results.append(await c.run_cpu_bound(fibonacci, 10))
+
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "fib")
+        await FibonacciCommand().handle(Context(signal_bot, message))
+        signal_bot.executors.shutdown()
+
+        self.assertEqual(results, [55])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import subprocess
+import sys
+
+HEAVY_MODULES = ["aiohttp", "apscheduler", "redis", "websockets", "signalbot.bot"]
+
+
+def loaded_modules(statement: str) -> list[str]:
+    code = (
+        f"import sys\n{statement}\n"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_signalbot_is_light(self):
+        self.assertEqual(loaded_modules("import signalbot"), [])
+
+    def test_command_and_message_are_light(self):
+        statement = "from signalbot import Command, Message, Context, triggered"
+        self.assertEqual(loaded_modules(statement), [])
+
+    def test_signalbot_is_imported_on_access(self):
+        loaded = loaded_modules("from signalbot import SignalBot")
+        self.assertIn("signalbot.bot", loaded)
+        self.assertIn("aiohttp", loaded)
+        # only needed once the bot starts
+        self.assertNotIn("apscheduler", loaded)
+        self.assertNotIn("redis", loaded)
+
+    def test_unknown_attribute(self):
+        import signalbot
+
+        with self.assertRaises(AttributeError):
+            signalbot.DoesNotExist
+
+
+if __name__ == "__main__":
+    unittest.main()
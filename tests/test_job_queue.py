@@ -0,0 +1,73 @@
+import unittest
+import asyncio
+from signalbot import SignalBot, JobQueue, OverflowPolicy
+
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_block_applies_backpressure(self):
+        q = JobQueue(maxsize=1)
+        await q.put("job1")
+
+        put_task = asyncio.create_task(q.put("job2"))
+        await asyncio.sleep(0.01)
+        self.assertFalse(put_task.done())
+
+        self.assertEqual(await q.get(), "job1")
+        await put_task
+        self.assertEqual(await q.get(), "job2")
+        self.assertGreater(q.stats()["enqueue_wait_max"], 0)
+
+    async def test_drop_oldest(self):
+        dropped = []
+        q = JobQueue(
+            maxsize=2, overflow=OverflowPolicy.DROP_OLDEST, on_drop=dropped.append
+        )
+        for job in ["job1", "job2", "job3"]:
+            await q.put(job)
+
+        self.assertEqual(dropped, ["job1"])
+        self.assertEqual([q.get_nowait(), q.get_nowait()], ["job2", "job3"])
+
+    async def test_drop_newest(self):
+        dropped = []
+        q = JobQueue(
+            maxsize=2, overflow=OverflowPolicy.DROP_NEWEST, on_drop=dropped.append
+        )
+        for job in ["job1", "job2", "job3"]:
+            await q.put(job)
+
+        self.assertEqual(dropped, ["job3"])
+        self.assertEqual([q.get_nowait(), q.get_nowait()], ["job1", "job2"])
+
+    async def test_stats(self):
+        q = JobQueue(maxsize=1, overflow=OverflowPolicy.DROP_NEWEST)
+        await q.put("job1")
+        await q.put("job2")
+
+        stats = q.stats()
+        self.assertEqual(stats["depth"], 1)
+        self.assertEqual(stats["maxsize"], 1)
+        self.assertEqual(stats["enqueued"], 1)
+        self.assertEqual(stats["dropped"], 1)
+
+
+class TestJobQueueConfig(unittest.IsolatedAsyncioTestCase):
+    config = {
+        "signal_service": "127.0.0.1:8080",
+        "phone_number": "+49123456789",
+    }
+
+    def test_default_queue_is_unbounded(self):
+        signal_bot = SignalBot(TestJobQueueConfig.config)
+        self.assertEqual(signal_bot.queue_stats()["maxsize"], 0)
+
+    def test_queue_config(self):
+        config = dict(TestJobQueueConfig.config)
+        config["queue"] = {"maxsize": 10, "overflow": "drop_oldest"}
+        signal_bot = SignalBot(config)
+        self.assertEqual(signal_bot._q.maxsize, 10)
+        self.assertIs(signal_bot._q.overflow, OverflowPolicy.DROP_OLDEST)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,11 @@
 import unittest
-from signalbot import Message, MessageType
+import json
+from signalbot import (
+    Message,
+    MessageType,
+    RawMessagePolicy,
+    UnknownMessageFormatError,
+)
 
 
 class TestMessage(unittest.TestCase):
@@ -67,6 +73,59 @@ class TestMessage(unittest.TestCase):
         self.assertEqual(message.timestamp, TestMessage.expected_timestamp)
         self.assertIsNone(message.group)
 
+    # Attachments
+    def test_parse_attachments(self):
+        raw_message = '{"envelope":{"source":"+490123456789","timestamp":1632576001632,"dataMessage":{"timestamp":1632576001632,"message":null,"attachments":[{"contentType":"image/png","filename":"image.png","id":"abc123.png","size":1024,"width":32,"height":32}]}}}'  # noqa
+        message = Message.parse(raw_message)
+        self.assertEqual(len(message.attachments), 1)
+        attachment = message.attachments[0]
+        self.assertEqual(attachment.id, "abc123.png")
+        self.assertEqual(attachment.content_type, "image/png")
+        self.assertEqual(attachment.size, 1024)
+
+    def test_parse_no_attachments(self):
+        message = Message.parse(TestMessage.raw_data_message)
+        self.assertEqual(message.attachments, [])
+
+    def test_parse_account(self):
+        message = Message.parse(TestMessage.raw_user_chat_message)
+        self.assertEqual(message.account, "+49987654321")
+
+    # Raw Message
+    def test_raw_message_lazy(self):
+        message = Message.parse(TestMessage.raw_data_message)
+        self.assertEqual(message.raw_message, json.loads(TestMessage.raw_data_message))
+
+    def test_raw_message_lazy_bytes(self):
+        raw_bytes = TestMessage.raw_data_message.encode("utf-8")
+        message = Message.parse(raw_bytes, RawMessagePolicy.LAZY)
+        self.assertEqual(message.text, TestMessage.expected_text)
+        self.assertEqual(message.raw_message, json.loads(TestMessage.raw_data_message))
+
+    def test_raw_message_keep(self):
+        message = Message.parse(TestMessage.raw_sync_message, RawMessagePolicy.KEEP)
+        self.assertEqual(message.raw_message, json.loads(TestMessage.raw_sync_message))
+
+    def test_raw_message_drop(self):
+        message = Message.parse(TestMessage.raw_sync_message, RawMessagePolicy.DROP)
+        self.assertIsNone(message.raw_message)
+
+    def test_raw_message_decoded(self):
+        decoded = json.loads(TestMessage.raw_data_message)
+        message = Message.parse(decoded)
+        self.assertEqual(message.text, TestMessage.expected_text)
+        self.assertIs(message.raw_message, decoded)
+
+    # Invalid Messages
+    def test_parse_invalid_json(self):
+        with self.assertRaises(UnknownMessageFormatError):
+            Message.parse("{")
+
+    def test_parse_unknown_envelope(self):
+        raw_message = '{"envelope":{"source":"+490123456789","timestamp":1,"receiptMessage":{}}}'  # noqa
+        with self.assertRaises(UnknownMessageFormatError):
+            Message.parse(raw_message)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import aiohttp
+from unittest.mock import patch, AsyncMock
+from signalbot import SignalBot, Command, Message, MessageType
+from signalbot.metrics import MetricsRegistry, MetricsError, PrometheusExporter
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter("requests_total", "Requests", ("status",))
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        counter.inc(status=500)
+        self.assertEqual(counter.value(status=200), 3)
+        self.assertEqual(counter.value(status=500), 1)
+
+    def test_same_metric_on_second_use(self):
+        counter = self.registry.counter("requests_total", "Requests")
+        self.assertIs(self.registry.counter("requests_total", "Requests"), counter)
+        with self.assertRaises(MetricsError):
+            self.registry.histogram("requests_total", "Requests")
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("latency", "Latency", buckets=(0.1, 1))
+        for value in [0.05, 0.5, 0.5, 5]:
+            histogram.observe(value)
+        samples = {(suffix, key): value for suffix, key, value in histogram.samples()}
+        self.assertEqual(samples[("_bucket", ("0.1",))], 1)
+        self.assertEqual(samples[("_bucket", ("1",))], 3)
+        self.assertEqual(samples[("_bucket", ("+Inf",))], 4)
+        self.assertEqual(samples[("_count", ())], 4)
+        self.assertEqual(samples[("_sum", ())], 6.05)
+
+    def test_render_prometheus(self):
+        self.registry.counter("requests_total", "Requests", ("path",)).inc(path='a"b')
+        self.registry.gauge("depth", "Depth", function=lambda: 3)
+        text = self.registry.render_prometheus()
+        self.assertIn("# TYPE signalbot_requests_total counter", text)
+        self.assertIn('signalbot_requests_total{path="a\\"b"} 1', text)
+        self.assertIn("signalbot_depth 3", text)
+
+
+class TestBotMetrics(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        config = {
+            "signal_service": "127.0.0.1:8080",
+            "phone_number": "+49123456789",
+        }
+        self.signal_bot = SignalBot(config)
+
+    async def test_command_metrics(self):
+        class FailingCommand(Command):
+            async def handle(self, c):
+                raise ValueError
+
+        self.signal_bot.listen("+49987654321")
+        self.signal_bot.register(FailingCommand())
+        message = Message("+49987654321", 1, MessageType.DATA_MESSAGE, "Hello")
+        await self.signal_bot._ask_commands_to_handle(message)
+        with self.assertRaises(ValueError):
+            await self.signal_bot._consume_new_item(1)
+
+        metrics = self.signal_bot.metrics
+        errors = metrics.counter("command_errors_total", "", ("command",))
+        duration = metrics.histogram("command_duration_seconds", "", ("command",))
+        self.assertEqual(errors.value(command="FailingCommand"), 1)
+        self.assertEqual(duration.count(command="FailingCommand"), 1)
+
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_api_metrics(self, mock):
+        mock.return_value = AsyncMock(spec=aiohttp.ClientResponse, status=201)
+        await self.signal_bot._signal.send("+49987654321", "Hello")
+        await self.signal_bot._signal.close()
+
+        responses = self.signal_bot.metrics.counter(
+            "api_responses_total", "", ("endpoint", "method", "status")
+        )
+        self.assertEqual(
+            responses.value(endpoint="/v2/send", method="post", status=201), 1
+        )
+
+    async def test_prometheus_exporter(self):
+        exporter = PrometheusExporter(host="127.0.0.1", port=0)
+        self.signal_bot.metrics.counter("test_total", "Test").inc()
+        await exporter.start(self.signal_bot.metrics)
+        port = exporter._runner.addresses[0][1]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                text = await resp.text()
+        await exporter.stop()
+        self.assertIn("signalbot_test_total 1", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import asyncio
+from signalbot.outbox import Outbox
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.outbox = Outbox(senders=2)
+        self.sent = []
+
+    async def asyncTearDown(self):
+        await self.outbox.close()
+
+    def send(self, chat: str, n: int, delay: float = 0):
+        async def send():
+            await asyncio.sleep(delay)
+            self.sent.append((chat, n))
+            return n
+
+        return send
+
+    async def test_future_of_the_result(self):
+        future = await self.outbox.submit("a", self.send("a", 1))
+        self.assertFalse(future.done())
+        self.assertEqual(await future, 1)
+
+    async def test_order_per_chat(self):
+        futures = [
+            await self.outbox.submit("a", self.send("a", n, delay=(3 - n) * 0.01))
+            for n in range(3)
+        ]
+        self.assertEqual(await asyncio.gather(*futures), [0, 1, 2])
+        self.assertEqual(self.sent, [("a", 0), ("a", 1), ("a", 2)])
+
+    async def test_chats_do_not_wait_for_each_other(self):
+        # "a" and "d" are served by different senders
+        slow = await self.outbox.submit("a", self.send("a", 1, delay=0.2))
+        fast = await self.outbox.submit("d", self.send("d", 2))
+
+        await fast
+        self.assertFalse(slow.done())
+        await slow
+
+    async def test_error_is_set_on_future(self):
+        async def fail():
+            raise ValueError("offline")
+
+        failed = await self.outbox.submit("a", fail)
+        sent = await self.outbox.submit("a", self.send("a", 1))
+
+        with self.assertRaises(ValueError):
+            await failed
+        self.assertEqual(await sent, 1)
+        self.assertEqual(self.outbox.failed, 1)
+
+    async def test_close_cancels_unsent_messages(self):
+        first = await self.outbox.submit("a", self.send("a", 1, delay=1))
+        second = await self.outbox.submit("a", self.send("a", 2))
+
+        await self.outbox.close(timeout=0.01)
+        self.assertTrue(first.cancelled())
+        self.assertTrue(second.cancelled())
+        self.assertEqual(self.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
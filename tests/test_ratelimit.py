@@ -0,0 +1,111 @@
+import unittest
+import time
+import aiohttp
+from unittest.mock import patch, AsyncMock, MagicMock
+from signalbot import SignalAPI
+from signalbot.ratelimit import RateLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(rate=1, burst=2)
+        now = time.monotonic()
+        for _ in range(2):
+            self.assertEqual(bucket.delay(now), 0)
+            bucket.take(now)
+        self.assertAlmostEqual(bucket.delay(now), 1, places=2)
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        now = time.monotonic()
+        bucket.take(now)
+        self.assertGreater(bucket.delay(now), 0)
+        self.assertEqual(bucket.delay(now + 0.2), 0)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_unlimited(self):
+        limiter = RateLimiter()
+        for _ in range(100):
+            await limiter.acquire(["+49123456789"])
+        self.assertEqual(limiter.stats()["delayed"], 0)
+
+    async def test_global_rate(self):
+        limiter = RateLimiter(rate=100, burst=1)
+        for _ in range(3):
+            await limiter.acquire()
+        stats = limiter.stats()
+        self.assertEqual(stats["acquired"], 3)
+        self.assertEqual(stats["delayed"], 2)
+
+    async def test_per_recipient_rate(self):
+        limiter = RateLimiter(per_recipient_rate=100, per_recipient_burst=1)
+        await limiter.acquire(["+49123456781"])
+        await limiter.acquire(["+49123456782"])
+        self.assertEqual(limiter.stats()["delayed"], 0)
+        await limiter.acquire(["+49123456781"])
+        self.assertEqual(limiter.stats()["delayed"], 1)
+
+    async def test_backoff(self):
+        limiter = RateLimiter()
+        limiter.backoff(0.02)
+        start_t = time.monotonic()
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start_t, 0.02)
+
+
+class TestRetryAfter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.limiter = RateLimiter()
+        self.signal_api = SignalAPI(
+            "127.0.0.1:8080", "+49123456789", rate_limiter=self.limiter, max_retries=1
+        )
+
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+
+    @classmethod
+    def response(cls, status, headers=None):
+        return AsyncMock(
+            spec=aiohttp.ClientResponse,
+            status=status,
+            headers=headers or {},
+            raise_for_status=MagicMock(),
+        )
+
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_retry_after_429(self, mock):
+        mock.side_effect = [
+            self.response(429, {"Retry-After": "0.01"}),
+            self.response(201),
+        ]
+        resp = await self.signal_api.send("+49123456781", "Hello")
+
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.call_count, 2)
+        stats = self.limiter.stats()
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertEqual(stats["retries"], 1)
+
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_give_up_after_max_retries(self, mock):
+        mock.return_value = self.response(429, {"Retry-After": "0"})
+        resp = await self.signal_api.send("+49123456781", "Hello")
+
+        self.assertEqual(mock.call_count, 2)
+        resp.raise_for_status.assert_called_once()
+        self.assertEqual(self.limiter.stats()["rejected"], 1)
+
+    @patch("aiohttp.ClientSession.post", new_callable=AsyncMock)
+    async def test_give_up_on_long_retry_after(self, mock):
+        mock.return_value = self.response(429, {"Retry-After": "3600"})
+        resp = await self.signal_api.send("+49123456781", "Hello")
+
+        self.assertEqual(mock.call_count, 1)
+        resp.raise_for_status.assert_called_once()
+        self.assertEqual(self.limiter.stats()["rejected"], 1)
+        self.assertEqual(self.limiter.stats()["retries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+from unittest.mock import patch, AsyncMock
+from signalbot import (
+    SignalBot,
+    Message,
+    MessageType,
+    ReceiveManager,
+    ConnectionState,
+)
+
+
+class TestReceiveManager(unittest.IsolatedAsyncioTestCase):
+    def test_is_duplicate(self):
+        manager = ReceiveManager(dedupe_window=2)
+        message1 = Message("+49123456789", 1, MessageType.DATA_MESSAGE, "1")
+        message2 = Message("+49123456789", 2, MessageType.DATA_MESSAGE, "2")
+        message3 = Message("+49123456789", 3, MessageType.DATA_MESSAGE, "3")
+
+        self.assertFalse(manager.is_duplicate(message1))
+        self.assertTrue(manager.is_duplicate(message1))
+        self.assertFalse(manager.is_duplicate(message2))
+        self.assertFalse(manager.is_duplicate(message3))
+        # message1 fell out of the window
+        self.assertFalse(manager.is_duplicate(message1))
+        self.assertEqual(manager.duplicates, 1)
+
+    def test_delay_grows_and_resets(self):
+        manager = ReceiveManager(min_delay=0.5, max_delay=4)
+        delays = [manager.next_delay() for _ in range(10)]
+        self.assertTrue(all(0.5 <= delay <= 4 for delay in delays))
+
+        manager.connected()
+        self.assertEqual(manager.next_delay(), 0.5)
+
+    async def test_run_reconnects(self):
+        manager = ReceiveManager(min_delay=0, max_delay=0)
+        states = []
+        manager.add_state_callback(states.append)
+        calls = 0
+
+        async def receive():
+            nonlocal calls
+            calls += 1
+            manager.connected()
+            if calls == 3:
+                await asyncio.Event().wait()
+            raise ConnectionError("connection lost")
+
+        with patch("traceback.print_exc"):
+            task = asyncio.create_task(manager.run(receive))
+            await asyncio.sleep(0.01)
+            task.cancel()
+
+        self.assertEqual(calls, 3)
+        self.assertEqual(manager.reconnects, 2)
+        self.assertEqual(
+            states[:4],
+            [
+                ConnectionState.CONNECTING,
+                ConnectionState.CONNECTED,
+                ConnectionState.DISCONNECTED,
+                ConnectionState.CONNECTING,
+            ],
+        )
+
+
+class TestProduceDeduplication(unittest.IsolatedAsyncioTestCase):
+    @patch("websockets.connect")
+    async def test_redelivered_message_is_dropped(self, mock):
+        message = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"dataMessage":{"timestamp":1633169000000,"message":"Message","expiresInSeconds":0,"viewOnce":false}}}'  # noqa
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = [message, message]
+        mock.return_value.__aenter__.return_value = mock_iterator
+
+        signal_bot = SignalBot(
+            {"signal_service": "127.0.0.1:8080", "phone_number": "+49123456789"}
+        )
+        await signal_bot._produce(1)
+        await signal_bot._produce(1)
+
+        self.assertEqual(signal_bot.receive_manager.duplicates, 3)
+        self.assertEqual(signal_bot.receive_manager.state, ConnectionState.CONNECTED)
+
+
+if __name__ == "__main__":
+    unittest.main()
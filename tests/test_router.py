@@ -0,0 +1,101 @@
+import unittest
+import re
+from signalbot import Command, Context, Message, MessageType, prefix, regex
+from signalbot.router import PrefixTrie, Router
+
+
+class Handle:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class TestPrefixTrie(unittest.TestCase):
+    def test_matches(self):
+        trie = PrefixTrie()
+        trie.insert("/w", 0)
+        trie.insert("/weather", 1)
+        trie.insert("/x", 2)
+
+        self.assertEqual(trie.matches("/weather berlin"), [(2, 0), (8, 1)])
+        self.assertEqual(trie.matches("/w"), [(2, 0)])
+        self.assertEqual(trie.matches("hello"), [])
+
+
+class TestRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = Router()
+
+    def test_prefix_args(self):
+        self.router.add(0, Handle(prefixes=("/weather",)))
+        routes = self.router.match("/WEATHER  new   york ")
+        self.assertEqual(routes[0].args, ["new", "york"])
+
+    def test_prefix_case_sensitive(self):
+        self.router.add(0, Handle(prefixes=("/Weather",), case_sensitive=True))
+        self.assertIn(0, self.router.match("/Weather berlin"))
+        self.assertNotIn(0, self.router.match("/weather berlin"))
+
+    def test_prefix_needs_word_boundary(self):
+        self.router.add(0, Handle(prefixes=("/w",)))
+        self.assertEqual(self.router.match("/weather"), {})
+
+    def test_not_routed(self):
+        self.assertFalse(self.router.add(0, Handle()))
+        self.assertEqual(self.router.match(None), {})
+
+    def test_combined_regexes(self):
+        self.router.add(0, Handle(regex=re.compile(r"(\d+)d(\d+)")))
+        self.router.add(1, Handle(regex=re.compile(r"^hello", re.IGNORECASE)))
+        self.router.add(2, Handle(regex=re.compile(r"bye$")))
+
+        routes = self.router.match("Hello, roll 2d20")
+        self.assertEqual(set(routes), {0, 1})
+        self.assertEqual(routes[0].match.groups(), ("2", "20"))
+        self.assertEqual(len(self.router._separate_regexes), 0)
+
+    def test_uncombinable_regexes(self):
+        self.router.add(0, Handle(regex=re.compile(r"(?P<word>\w+) (?P=word)")))
+        self.router.add(1, Handle(regex=re.compile(r"(a)\1")))
+        self.router.add(2, Handle(regex=re.compile(r"(?i)abc")))
+        self.router.add(3, Handle(regex=re.compile(r"a b", re.VERBOSE)))
+
+        self.assertEqual(len(self.router._separate_regexes), 4)
+        routes = self.router.match("bye bye aa ABC ab")
+        self.assertEqual(set(routes), {0, 1, 2, 3})
+        self.assertEqual(routes[0].match.group("word"), "bye")
+
+
+class TestDecoratorsWithoutRouter(unittest.IsolatedAsyncioTestCase):
+    async def handle(self, command: Command, text: str):
+        message = Message("+49123456789", 1, MessageType.DATA_MESSAGE, text)
+        context = Context(None, message)
+        await command.handle(context)
+        return context
+
+    async def test_prefix(self):
+        handled = []
+
+        class WeatherCommand(Command):
+            @prefix("/w", "/weather")
+            async def handle(self, c):
+                handled.append(c.args)
+
+        await self.handle(WeatherCommand(), "/weather berlin")
+        await self.handle(WeatherCommand(), "/wetter berlin")
+        self.assertEqual(handled, [["berlin"]])
+
+    async def test_regex(self):
+        handled = []
+
+        class DiceCommand(Command):
+            @regex(r"(\d+)d(\d+)")
+            async def handle(self, c):
+                handled.append(c.match.groups())
+
+        await self.handle(DiceCommand(), "roll 1d6")
+        await self.handle(DiceCommand(), "roll")
+        self.assertEqual(handled, [("1", "6")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import patch
+from signalbot import SignalBot
+from signalbot.storage import (
+    AsyncInMemoryStorage,
+    AsyncRedisStorage,
+    CachedStorage,
+    InMemoryStorage,
+    StorageError,
+)
+
+
+class TestCachedStorage(unittest.TestCase):
+    def setUp(self):
+        self.backend = InMemoryStorage()
+        self.storage = CachedStorage(self.backend, maxsize=2, ttl=60)
+
+    def test_read_through(self):
+        self.backend.save("key", {"a": 1})
+        self.assertEqual(self.storage.read("key"), {"a": 1})
+        self.assertEqual(self.storage.read("key"), {"a": 1})
+        self.assertEqual(self.storage.stats()["misses"], 1)
+        self.assertEqual(self.storage.stats()["hits"], 1)
+
+    def test_save_writes_through(self):
+        self.storage.save("key", "value")
+        self.assertEqual(self.backend.read("key"), "value")
+        self.assertEqual(self.storage.read("key"), "value")
+        self.assertEqual(self.storage.stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        for key in ["a", "b", "c"]:
+            self.storage.save(key, key)
+        self.assertEqual(self.storage.stats()["size"], 2)
+
+        self.storage.read("a")
+        self.assertEqual(self.storage.stats()["misses"], 1)
+
+    def test_ttl_expiry(self):
+        self.storage.save("key", "value")
+        with patch("time.monotonic", return_value=10**9):
+            self.storage.read("key")
+        self.assertEqual(self.storage.stats()["misses"], 1)
+
+    def test_write_behind(self):
+        storage = CachedStorage(self.backend, write_behind=True)
+        storage.save("key", "value")
+        self.assertFalse(self.backend.exists("key"))
+        self.assertTrue(storage.exists("key"))
+        self.assertEqual(storage.read("key"), "value")
+
+        storage.flush()
+        self.assertEqual(self.backend.read("key"), "value")
+        self.assertEqual(storage.stats()["pending"], 0)
+
+    def test_write_behind_rejects_invalid_objects(self):
+        storage = CachedStorage(self.backend, write_behind=True)
+        with self.assertRaises(StorageError):
+            storage.save("key", object())
+
+
+class TestCachedStorageConfig(unittest.IsolatedAsyncioTestCase):
+    def test_cache_config(self):
+        config = {
+            "signal_service": "127.0.0.1:8080",
+            "phone_number": "+49123456789",
+            "storage": {"cache": {"maxsize": 10, "write_behind": True}},
+        }
+        signal_bot = SignalBot(config)
+        self.assertIsInstance(signal_bot.storage, CachedStorage)
+        self.assertEqual(len(signal_bot.scheduler.get_jobs()), 1)
+
+
+class TestAsyncInMemoryStorage(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.storage = AsyncInMemoryStorage()
+
+    async def test_save_and_read(self):
+        await self.storage.save("key", {"a": [1, 2]})
+        self.assertTrue(await self.storage.exists("key"))
+        self.assertEqual(await self.storage.read("key"), {"a": [1, 2]})
+
+    async def test_read_missing_key(self):
+        self.assertFalse(await self.storage.exists("missing"))
+        with self.assertRaises(StorageError):
+            await self.storage.read("missing")
+
+    async def test_shares_data_with_sync_storage(self):
+        storage = InMemoryStorage()
+        async_storage = AsyncInMemoryStorage(storage)
+        storage.save("key", "value")
+        self.assertEqual(await async_storage.read("key"), "value")
+
+
+class TestAsyncRedisStorage(unittest.IsolatedAsyncioTestCase):
+    async def test_connection_pool(self):
+        storage = AsyncRedisStorage("localhost", 6379, max_connections=5)
+        self.assertEqual(storage._pool.max_connections, 5)
+        await storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
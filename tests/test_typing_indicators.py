@@ -0,0 +1,97 @@
+import unittest
+import asyncio
+from unittest.mock import AsyncMock
+from signalbot import SignalBot, Context, Message, MessageType
+from signalbot.typing_indicators import TypingIndicators
+
+
+class FakeSignal:
+    phone_number = "+49123456789"
+
+    def __init__(self):
+        self.start_typing = AsyncMock()
+        self.stop_typing = AsyncMock()
+
+
+class TestTypingIndicators(unittest.IsolatedAsyncioTestCase):
+    receiver = "+49987654321"
+
+    async def asyncSetUp(self):
+        self.signal = FakeSignal()
+        self.typing_indicators = TypingIndicators(refresh_interval=0.01)
+
+    async def test_refreshed_until_done(self):
+        async with self.typing_indicators.typing(self.signal, self.receiver):
+            await asyncio.sleep(0.05)
+            self.assertTrue(
+                self.typing_indicators.active(FakeSignal.phone_number, self.receiver)
+            )
+
+        self.assertGreater(self.signal.start_typing.await_count, 1)
+        self.signal.stop_typing.assert_awaited_once_with(self.receiver)
+        self.assertEqual(self.typing_indicators._indicators, {})
+
+    async def test_overlapping_holders_share_one_indicator(self):
+        self.typing_indicators.refresh_interval = 60
+        first_done = asyncio.Event()
+
+        async def handler(wait: asyncio.Event = None):
+            async with self.typing_indicators.typing(self.signal, self.receiver):
+                await asyncio.sleep(0)
+                if wait is not None:
+                    await wait.wait()
+
+        second = asyncio.create_task(handler(first_done))
+        await handler()
+        self.signal.stop_typing.assert_not_awaited()
+
+        first_done.set()
+        await second
+        self.signal.start_typing.assert_awaited_once_with(self.receiver)
+        self.signal.stop_typing.assert_awaited_once_with(self.receiver)
+
+    async def test_sent_message_ends_indicator(self):
+        async with self.typing_indicators.typing(self.signal, self.receiver):
+            await asyncio.sleep(0)
+            self.typing_indicators.sent(FakeSignal.phone_number, self.receiver)
+            self.assertFalse(
+                self.typing_indicators.active(FakeSignal.phone_number, self.receiver)
+            )
+
+        self.signal.stop_typing.assert_not_awaited()
+
+    async def test_close_stops_refreshing(self):
+        async with self.typing_indicators.typing(self.signal, self.receiver):
+            await asyncio.sleep(0)
+            await self.typing_indicators.close()
+            self.assertFalse(
+                self.typing_indicators.active(FakeSignal.phone_number, self.receiver)
+            )
+
+    async def test_errors_do_not_reach_the_handler(self):
+        self.signal.start_typing.side_effect = Exception("offline")
+        self.signal.stop_typing.side_effect = Exception("offline")
+        async with self.typing_indicators.typing(self.signal, self.receiver):
+            await asyncio.sleep(0)
+
+
+class TestContextTyping(unittest.IsolatedAsyncioTestCase):
+    async def test_context_typing(self):
+        signal_bot = SignalBot(
+            {"signal_service": "127.0.0.1:8080", "phone_number": "+49123456789"}
+        )
+        signal = signal_bot._signal
+        signal.start_typing = AsyncMock()
+        signal.stop_typing = AsyncMock()
+        message = Message("+49987654321", 1, MessageType.DATA_MESSAGE, "Hi")
+
+        async with Context(signal_bot, message).typing():
+            await asyncio.sleep(0)
+
+        signal.start_typing.assert_awaited_once_with("+49987654321")
+        signal.stop_typing.assert_awaited_once_with("+49987654321")
+        await signal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import base64
+import io
+import json
+import os
+import tempfile
+from signalbot.upload import json_body_with_attachments
+
+
+class NonSeekable(io.RawIOBase):
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        # return less than asked for, like pipes and sockets do
+        return self._data.read(min(size, 1000))
+
+
+async def read_body(body) -> dict:
+    chunks = [chunk async for chunk in body()]
+    return json.loads(b"".join(bytes(chunk) for chunk in chunks))
+
+
+class TestJsonBodyWithAttachments(unittest.IsolatedAsyncioTestCase):
+    payload = {"message": "Hello", "recipients": ["+49123456789"]}
+    content = os.urandom(100000)
+
+    async def test_bytes(self):
+        body = json_body_with_attachments(
+            TestJsonBodyWithAttachments.payload,
+            [TestJsonBodyWithAttachments.content],
+            chunk_size=3 * 1024,
+        )
+        decoded = await read_body(body)
+
+        self.assertEqual(decoded["message"], "Hello")
+        self.assertEqual(
+            base64.b64decode(decoded["base64_attachments"][0]),
+            TestJsonBodyWithAttachments.content,
+        )
+
+    async def test_path_and_inline_base64(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "video.mp4")
+            with open(path, "wb") as f:
+                f.write(TestJsonBodyWithAttachments.content)
+
+            payload = dict(TestJsonBodyWithAttachments.payload)
+            payload["base64_attachments"] = ["aGVsbG8="]
+            decoded = await read_body(json_body_with_attachments(payload, [path]))
+
+        attachments = decoded["base64_attachments"]
+        self.assertEqual(attachments[0], "aGVsbG8=")
+        self.assertEqual(
+            base64.b64decode(attachments[1]), TestJsonBodyWithAttachments.content
+        )
+
+    async def test_seekable_file_is_replayed(self):
+        f = io.BytesIO(TestJsonBodyWithAttachments.content)
+        body = json_body_with_attachments({}, [f])
+
+        first = await read_body(body)
+        second = await read_body(body)
+        self.assertEqual(first, second)
+
+    async def test_non_seekable_file(self):
+        body = json_body_with_attachments(
+            {}, [NonSeekable(TestJsonBodyWithAttachments.content)]
+        )
+
+        decoded = await read_body(body)
+        self.assertEqual(
+            base64.b64decode(decoded["base64_attachments"][0]),
+            TestJsonBodyWithAttachments.content,
+        )
+        with self.assertRaises(ValueError):
+            await read_body(body)
+
+    def test_unsupported_attachment(self):
+        with self.assertRaises(TypeError):
+            json_body_with_attachments({}, [42])
+
+
+if __name__ == "__main__":
+    unittest.main()